@@ -0,0 +1,148 @@
+# Run many span cases across a process pool.
+#
+# Results come back in the same order as the cases, and each case is
+# calculated exactly as engine.calculate would on its own, so a batch run
+# gives the same numbers whatever the number of workers.
+
+import collections
+import concurrent.futures
+import functools
+import itertools
+import os
+
+import engine
+import profiling
+
+
+# One span to analyze. The defaults match the calculator window.
+SpanCase = collections.namedtuple('SpanCase', ['span_length',
+                                               'x_loc',
+                                               'increment',
+                                               'impact_factor',
+                                               'dist_factor',
+                                               'x_is_fraction',
+                                               'train'])
+SpanCase.__new__.__defaults__ = (1, 0, 1, False, None)
+
+
+def make_case(case):
+    # Accept SpanCases, plain tuples or dicts with SpanCase's field names
+    if isinstance(case, SpanCase):
+        return case
+    if isinstance(case, dict):
+        return SpanCase(**case)
+    return SpanCase(*case)
+
+
+def case_params(case, engine_name=None):
+    # Cache key inputs for a case, with x_loc in feet
+    engine.check_inputs(case.span_length, case.increment)
+    x_loc = engine.resolve_x_loc(case.span_length, case.x_loc,
+                                 case.x_is_fraction)
+    return engine.result_params(case.span_length, x_loc, case.increment,
+                                engine_name, case.train)
+
+
+def run_unfactored(case, engine_name=None):
+    span_length, x_loc, increment = case_params(case, engine_name)[:3]
+    return engine.unfactored_result(span_length, x_loc, increment,
+                                    engine_name, train=case.train)
+
+
+def default_chunksize(num_cases, workers):
+    # A few chunks per worker keeps them all busy without paying for a
+    # round trip per case
+    return max(1, -(-num_cases // (workers*4)))
+
+
+def map_cases(run, cases, workers, chunksize=None):
+    if workers == 1 or len(cases) <= 1:
+        return [run(case) for case in cases]
+
+    chunksize = chunksize or default_chunksize(len(cases), workers)
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(run, cases, chunksize=chunksize))
+
+
+def run_batch(cases, workers=None, chunksize=None, engine_name=None,
+              cache=None):
+    # Calculate every case and return the Results in input order. workers
+    # defaults to the number of cores; workers=1 runs in this process.
+    # With a cache.ResultCache, only cases missing from it are sent to the
+    # pool.
+    cases = [make_case(case) for case in cases]
+    workers = workers or os.cpu_count() or 1
+    run = functools.partial(run_unfactored, engine_name=engine_name)
+
+    if cache is None:
+        results = map_cases(run, cases, workers, chunksize)
+    else:
+        params = [case_params(case, engine_name) for case in cases]
+        results = [cache.lookup('calculate', p) for p in params]
+        missing = [i for i, result in enumerate(results) if result is None]
+        computed = map_cases(run, [cases[i] for i in missing], workers,
+                             chunksize)
+        for i, result in zip(missing, computed):
+            cache.store('calculate', params[i], result)
+            results[i] = result
+
+    return [engine.factor_result(engine.Result(*result), case.impact_factor,
+                                 case.dist_factor)
+            for case, result in zip(cases, results)]
+
+
+def run_job(case, n=None, engine_name=None, profile=False):
+    # Result for a case, plus its n-th point envelope if n is given, and a
+    # profiling.Stats for them if profile is set. Bad input is returned as
+    # the error message so one bad row doesn't stop a stream; a case that
+    # is already an error message is passed through.
+    if isinstance(case, str):
+        return case
+    stats = profiling.Stats(trace_memory=True) if profile else None
+    try:
+        case = make_case(case)
+        result = engine.calculate(case.span_length, case.x_loc,
+                                  case.increment, case.impact_factor,
+                                  case.dist_factor, case.x_is_fraction,
+                                  engine=engine_name, train=case.train,
+                                  stats=stats)
+        envelope = None
+        if n:
+            envelope = engine.envelope(case.span_length, n, case.increment,
+                                       case.impact_factor, case.dist_factor,
+                                       engine=engine_name, train=case.train,
+                                       stats=stats)
+    except (TypeError, ValueError) as error:
+        return str(error)
+    if profile:
+        return result, envelope, stats
+    return result, envelope
+
+
+def run_jobs(jobs, engine_name=None, profile=False):
+    return [run_job(case, n, engine_name, profile) for case, n in jobs]
+
+
+def iter_batch(jobs, workers=None, chunksize=16, engine_name=None,
+               prefetch=4, profile=False):
+    # Stream (case, n) jobs through the pool, yielding run_job's output in
+    # input order as soon as each chunk is done. jobs can be any iterable
+    # and is read lazily: at most workers*prefetch chunks are in flight.
+    workers = workers or os.cpu_count() or 1
+    jobs = iter(jobs)
+    chunks = iter(lambda: list(itertools.islice(jobs, chunksize)), [])
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from run_jobs(chunk, engine_name, profile)
+        return
+
+    pending = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        for chunk in chunks:
+            pending.append(executor.submit(run_jobs, chunk, engine_name,
+                                           profile))
+            if len(pending) >= workers*prefetch:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,320 @@
+# Benchmarks.
+#
+# Times engine.calculate (a single section) and engine.envelope (the n-th
+# point plots) for each engine over a matrix of span lengths, increments
+# and n-th point counts, and checks every result against the reference
+# engine and the exact one. Runs headless. Timings can be saved as a JSON
+# baseline and later runs compared with it:
+#
+#     python bench.py -o baseline.json
+#     python bench.py --compare baseline.json
+#
+# The comparison exits with status 1 if any case got slower by more than
+# the threshold or any result failed its check. `python bench.py --verify`
+# skips the timings and checks every engine against the reference with
+# every registered train, on a smaller matrix.
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import engine
+import trains
+
+
+BASELINE_VERSION = 1
+
+SPANS = (10, 50, 100, 200, 500)
+INCREMENTS = (1/16, 1, 12)
+NTH_POINTS = (10, 100)
+
+# Reference runs bigger than this many axle evaluations are skipped, as
+# they would take minutes
+MAX_REFERENCE_WORK = 2e7
+
+# Results must agree with the reference and the exact engine to within
+# what STEP_TOLERANCE steps of the train can change them by (the step
+# times step_slopes). The exact engine finds the true extremes, so no
+# engine may beat it, and it may not fall short of the reference, by more
+# than ROUNDING relative to the largest value (or 1).
+STEP_TOLERANCE = 1
+ROUNDING = 1e-9
+
+# The smaller matrix for --verify, which runs it for every train
+VERIFY_SPANS = (10, 37.5, 100, 300)
+VERIFY_INCREMENTS = (1, 12)
+VERIFY_NTH_POINTS = (10,)
+
+# Runs longer than this aren't repeated
+REPEAT_LIMIT = 1.0
+
+
+def time_call(function, repeat):
+    # Best time of up to repeat calls, and the last return value
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if elapsed > REPEAT_LIMIT:
+            break
+    return best, value
+
+
+def reference_work(span_length, increment, sections=1, train=None):
+    # Rough number of axle evaluations the reference engine needs
+    consist = trains.get_train(train).consist(span_length)
+    positions = (span_length + consist.length)*12/increment
+    return positions*len(consist.loads)*sections
+
+
+def step_slopes(span_length, train=None):
+    # Upper bounds on how fast the moment and the shear at any section can
+    # change, per foot the train moves. Each kip on the span changes the
+    # moment by at most 1 and the shear by 1/span; the edges of a uniform
+    # load add at most span/4 and 2 per kip/ft. Jumps in shear as an axle
+    # passes the section are not counted, as the engines take the larger
+    # side of them.
+    consist = trains.get_train(train).consist(span_length)
+    uniform = sum(load for _, _, load in consist.segments)
+
+    # The heaviest run of axles that fits on the span
+    heaviest = total = 0.0
+    first = 0
+    for load, offset in zip(consist.loads, consist.offsets):
+        total += load
+        while offset - consist.offsets[first] > span_length:
+            total -= consist.loads[first]
+            first += 1
+        heaviest = max(heaviest, total)
+
+    load = heaviest + uniform*span_length
+    return (load + uniform*span_length/4,
+            load/span_length + 2*uniform)
+
+
+def result_values(result):
+    # The extremes in a result, with minimums negated so that every value
+    # is a maximum
+    if isinstance(result, engine.Envelope):
+        return (result.max_moments, result.max_shears,
+                [-value for value in result.min_shears])
+    return ([result.max_moment], [result.max_shear])
+
+
+def check_result(engine_name, result, reference, exact, span_length,
+                 increment, train=None):
+    # 'ok', 'FAIL' or 'skipped', and the worst difference relative to the
+    # largest value. reference and exact can be None if they weren't run.
+    if reference is None and exact is None:
+        return 'skipped', None
+    m_slope, v_slope = step_slopes(span_length, train)
+    step = STEP_TOLERANCE*increment/12
+    worst = 0.0
+    ok = True
+    for other, name in ((reference, 'reference'), (exact, 'exact')):
+        if other is None or name == engine_name:
+            continue
+        for k, (values, other_values) in enumerate(
+                zip(result_values(result), result_values(other))):
+            scale = max(max(abs(value) for value in other_values), 1.0)
+            tolerance = step*(m_slope if k == 0 else v_slope)
+            for value, other_value in zip(values, other_values):
+                diff = value - other_value
+                worst = max(worst, abs(diff)/scale)
+                ok = ok and abs(diff) <= tolerance + ROUNDING*scale
+                if name == 'exact':
+                    ok = ok and diff <= ROUNDING*scale
+                elif engine_name == 'exact':
+                    ok = ok and diff >= -ROUNDING*scale
+    return ('ok' if ok else 'FAIL'), worst
+
+
+def cases(spans, increments, nth_points):
+    # (path, span, increment, n) for each benchmark, n None for calculate
+    for span_length in spans:
+        for increment in increments:
+            yield 'calculate', span_length, increment, None
+            for n in nth_points:
+                yield 'envelope', span_length, increment, n
+
+
+def run_case(path, span_length, increment, n, engine_name, repeat,
+             train=None):
+    if path == 'calculate':
+        return time_call(lambda: engine.calculate(
+            span_length, span_length/2, increment, engine=engine_name,
+            train=train), repeat)
+    return time_call(lambda: engine.envelope(
+        span_length, n, increment, engine=engine_name, train=train), repeat)
+
+
+def run(spans=SPANS, increments=INCREMENTS, nth_points=NTH_POINTS,
+        engines=None, repeat=3, max_reference_work=MAX_REFERENCE_WORK,
+        report=None, train=None):
+    # Benchmark records for the whole matrix. report, if given, is called
+    # with each record as it is finished.
+    engines = list(engines or sorted(engine.ENGINES))
+    records = []
+    for path, span_length, increment, n in cases(spans, increments,
+                                                 nth_points):
+        reference = exact = None
+        work = reference_work(span_length, increment,
+                              1 if n is None else n + 1, train)
+        if work <= max_reference_work:
+            seconds, reference = run_case(path, span_length, increment, n,
+                                          'reference', 1, train)
+        if 'exact' in engine.ENGINES:
+            seconds, exact = run_case(path, span_length, increment, n,
+                                      'exact', 1, train)
+        for engine_name in engines:
+            if engine_name == 'reference' and reference is None:
+                continue
+            seconds, result = run_case(path, span_length, increment, n,
+                                       engine_name, repeat, train)
+            status, error = check_result(engine_name, result, reference,
+                                         exact, span_length, increment,
+                                         train)
+            record = {'path': path,
+                      'engine': engine_name,
+                      'span_length': span_length,
+                      'increment': increment,
+                      'n': n,
+                      'seconds': seconds,
+                      'check': status,
+                      'error': error}
+            records.append(record)
+            if report is not None:
+                report(record)
+    return records
+
+
+def verify(engines=None, report=None):
+    # Quick check of every engine against the reference loop with every
+    # registered train, on a small matrix. Returns the records.
+    records = []
+    for name in trains.train_names():
+        for record in run(VERIFY_SPANS, VERIFY_INCREMENTS, VERIFY_NTH_POINTS,
+                          engines, repeat=1, train=name):
+            record['train'] = name
+            records.append(record)
+            if report is not None:
+                report(record)
+    return records
+
+
+def case_key(record):
+    return (record['path'], record['engine'], record['span_length'],
+            record['increment'], record['n'], record.get('train'))
+
+
+def describe(record):
+    text = '%-9s %-9s span %5g ft  incr %7.4f in' % (
+        record['path'], record['engine'], record['span_length'],
+        record['increment'])
+    if 'train' in record:
+        text = '%-13s %s' % (record['train'], text)
+    if record['n'] is not None:
+        text += '  n %4d' % record['n']
+    return text
+
+
+def print_record(record):
+    error = record['error']
+    print('%s  %9.4f s  %-7s %s' % (describe(record), record['seconds'],
+                                    record['check'],
+                                    '' if error is None else '%.2e' % error))
+    sys.stdout.flush()
+
+
+def baseline(records):
+    return {'version': BASELINE_VERSION,
+            'python': platform.python_version(),
+            'numpy': engine.np.__version__ if engine.np is not None
+            else None,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'records': records}
+
+
+def compare(records, old, threshold):
+    # Print the time ratio for each case also in the old baseline and
+    # return the slowed-down records
+    old_times = {case_key(record): record['seconds']
+                 for record in old['records']}
+    slower = []
+    for record in records:
+        before = old_times.get(case_key(record))
+        if before is None:
+            continue
+        ratio = record['seconds']/max(before, 1e-9)
+        flag = ''
+        if ratio > threshold:
+            slower.append(record)
+            flag = '  SLOWER'
+        print('%s  %9.4f s -> %9.4f s  x%.2f%s' % (
+            describe(record), before, record['seconds'], ratio, flag))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark and check the moving-load engines.')
+    parser.add_argument('--spans', nargs='+', type=float, default=SPANS,
+                        help='span lengths in feet')
+    parser.add_argument('--increments', nargs='+', type=float,
+                        default=INCREMENTS, help='increments in inches')
+    parser.add_argument('--nth', nargs='*', type=int, default=NTH_POINTS,
+                        help='n-th point counts for envelopes')
+    parser.add_argument('--engines', nargs='+',
+                        choices=sorted(engine.ENGINES))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='best of this many runs')
+    parser.add_argument('--max-reference-work', type=float,
+                        default=MAX_REFERENCE_WORK,
+                        help='skip reference checks bigger than this many '
+                        'axle evaluations')
+    parser.add_argument('-o', '--output', help='save a JSON baseline')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio reported as a regression')
+    parser.add_argument('--verify', action='store_true',
+                        help='only check every engine against the '
+                        'reference, with every train')
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        records = verify(args.engines, print_record)
+        failures = [record for record in records
+                    if record['check'] == 'FAIL']
+        for record in failures:
+            print('Check failed: ' + describe(record))
+        return 1 if failures else 0
+
+    records = run(args.spans, args.increments, args.nth, args.engines,
+                  args.repeat, args.max_reference_work,
+                  report=None if args.compare else print_record)
+    failures = [record for record in records if record['check'] == 'FAIL']
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(baseline(records), f, indent=1)
+
+    slower = []
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(records, json.load(f), args.threshold)
+
+    for record in failures:
+        print('Check failed: ' + describe(record))
+    if slower:
+        print('%d case(s) slower than x%g' % (len(slower), args.threshold))
+    return 1 if failures or slower else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# Cache of unfactored results.
+#
+# Results are stored before impact and distribution factors are applied,
+# keyed by a hash of everything else that goes into them (span, section,
+# increment, engine and train), so repeat cases and factor-only changes
+# skip the sweep. Recent results are kept in memory and all of them in a
+# sqlite file under the user cache directory, so they survive restarts.
+
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+
+# Bump when a change to the engine alters results, so stale entries are
+# never returned
+CACHE_VERSION = 4
+
+
+def user_cache_dir():
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME',
+                              os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'mvcalc')
+
+
+def default_path():
+    return os.path.join(user_cache_dir(), 'results.sqlite')
+
+
+def make_key(kind, params):
+    # Content hash of the inputs. repr keeps every digit of the floats.
+    text = json.dumps([CACHE_VERSION, kind, params], default=repr,
+                      separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResultCache:
+    # In-memory LRU cache of up to max_entries results, backed by a sqlite
+    # file at path (default_path() if not given). Pass persistent=False to
+    # keep results in memory only.
+
+    def __init__(self, max_entries=1024, path=None, persistent=True):
+        if persistent and path is None:
+            path = default_path()
+        elif not persistent:
+            path = None
+        self.max_entries = max_entries
+        self.path = path
+        self.memory = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS results '
+                            '(key TEXT PRIMARY KEY, value TEXT)')
+            self.db.commit()
+
+    def get(self, key):
+        # Stored value for key, or None
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+            if self.db is None:
+                return None
+            row = self.db.execute('SELECT value FROM results WHERE key = ?',
+                                  (key,)).fetchone()
+            if row is None:
+                return None
+            value = json.loads(row[0])
+            self.remember(key, value)
+            return value
+
+    def put(self, key, value):
+        # value must be JSON serializable (namedtuples of floats and lists
+        # are stored as lists)
+        value = json.loads(json.dumps(value))
+        with self.lock:
+            self.remember(key, value)
+            if self.db is not None:
+                self.db.execute('INSERT OR REPLACE INTO results VALUES '
+                                '(?, ?)', (key, json.dumps(value)))
+                self.db.commit()
+
+    def remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def lookup(self, kind, params):
+        # Stored value for these inputs, or None, counting hits and misses
+        value = self.get(make_key(kind, params))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def store(self, kind, params, value):
+        self.put(make_key(kind, params), value)
+
+    def fetch(self, kind, params, compute):
+        # Stored value for these inputs, calling compute() to fill it in on
+        # a miss
+        value = self.lookup(kind, params)
+        if value is None:
+            value = compute()
+            self.store(kind, params, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute('DELETE FROM results')
+                self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def open_cache(max_entries=1024):
+    # The default persistent cache, or a memory-only one if the cache
+    # directory can't be written
+    try:
+        return ResultCache(max_entries)
+    except (OSError, sqlite3.Error):
+        return ResultCache(max_entries, persistent=False)
@@ -0,0 +1,227 @@
+# Command-line batch mode.
+#
+# Reads span cases from a CSV or JSONL file (or stdin) and writes one
+# output record per case, in input order, as soon as it is calculated.
+# Cases are streamed through the worker pool, so memory use doesn't grow
+# with the size of the run.
+#
+#     python mvcalc.py cases.csv -o results.jsonl --workers 8 --nth 20
+#
+# Input columns are SpanCase's fields (span_length and x_loc are required,
+# train is a name from trains.py) and an optional n for that case's n-th
+# point envelope. Any other columns (an id, say) are copied to the output.
+
+import argparse
+import collections
+import contextlib
+import csv
+import json
+import sys
+import time
+
+import batch
+import engine
+import profiling
+import trains
+
+
+RESULT_FIELDS = list(engine.Result._fields)
+ENVELOPE_FIELDS = list(engine.Envelope._fields)
+
+TRUE_STRINGS = ('1', 'true', 'yes', 'y')
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    # A line that isn't a JSON object is passed on as a ValueError, so the
+    # run can report it against that row and carry on
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield ValueError('line %d: %s' % (number, error))
+            continue
+        if isinstance(row, dict):
+            yield row
+        else:
+            yield ValueError('line %d: not a JSON object' % number)
+
+
+def parse_row(row, default_n=None, default_train=None):
+    # SpanCase and n from an input row. CSV values are all strings.
+    if isinstance(row, ValueError):
+        raise row
+    values = {'train': default_train}
+    for field in batch.SpanCase._fields:
+        value = row.get(field)
+        if value is None or value == '':
+            continue
+        if field == 'x_is_fraction':
+            if isinstance(value, str):
+                value = value.strip().lower() in TRUE_STRINGS
+            values[field] = bool(value)
+        elif field == 'train':
+            values[field] = str(value)
+        else:
+            values[field] = float(value)
+    n = row.get('n') or default_n
+    return batch.SpanCase(**values), int(n) if n else None
+
+
+def jobs_from_rows(rows, default_n, default_train=None):
+    # Jobs for the pool, with the raw rows kept aside for the output. Rows
+    # that can't be parsed become jobs that report the error, in the same
+    # way as the pool reports a case it can't calculate.
+    for row in rows:
+        try:
+            yield row, parse_row(row, default_n, default_train)
+        except (TypeError, ValueError) as error:
+            yield (row if isinstance(row, dict) else {},
+                   (str(error), None))
+
+
+def output_record(row, output):
+    # Errors from parsing and from the pool are both bad input, reported
+    # the same way
+    record = dict(row)
+    if isinstance(output, str):
+        record['error'] = 'Invalid input: ' + output
+        return record
+    result, envelope = output[:2]
+    record.update(result._asdict())
+    if envelope is not None:
+        record.update(envelope._asdict())
+    return record
+
+
+class CSVWriter:
+    # Writes records as CSV, with list values (envelopes) JSON encoded.
+    # The header is the input columns, then the result columns, the
+    # envelope columns if any row can have an envelope, and the error.
+    # JSONL input has no header, so its columns are SpanCase's fields and
+    # n, plus any others in the first record.
+
+    def __init__(self, stream, with_envelope, columns=None):
+        self.stream = stream
+        self.with_envelope = with_envelope
+        self.columns = columns
+        self.writer = None
+
+    def write(self, record):
+        if self.writer is None:
+            columns = self.columns
+            if columns is None:
+                columns = list(batch.SpanCase._fields) + ['n']
+                columns += [f for f in record if f not in columns]
+            fields = [f for f in columns if f not in RESULT_FIELDS
+                      and f not in ENVELOPE_FIELDS and f != 'error']
+            fields += RESULT_FIELDS
+            if self.with_envelope:
+                fields += ENVELOPE_FIELDS
+            fields.append('error')
+            self.writer = csv.DictWriter(self.stream, fields,
+                                         extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerow({key: json.dumps(value)
+                              if isinstance(value, list) else value
+                              for key, value in record.items()})
+
+
+class JSONLWriter:
+
+    def __init__(self, stream, with_envelope, columns=None):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(json.dumps(record) + '\n')
+
+
+def guess_format(path, default='csv'):
+    if path and path != '-' and path.endswith(('.jsonl', '.json')):
+        return 'jsonl'
+    if path and path.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def open_stream(path, mode):
+    # stdin/stdout for -, left open afterwards
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin if mode == 'r'
+                                      else sys.stdout)
+    return open(path, mode, newline='')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='mvcalc',
+        description='Max moment/shear for a file of span cases.')
+    parser.add_argument('input', help='CSV or JSONL cases, or - for stdin')
+    parser.add_argument('-o', '--output', default='-',
+                        help='output file (default stdout)')
+    parser.add_argument('--input-format', choices=['csv', 'jsonl'])
+    parser.add_argument('--output-format', choices=['csv', 'jsonl'])
+    parser.add_argument('--workers', type=int,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--chunksize', type=int, default=16,
+                        help='cases sent to a worker at a time')
+    parser.add_argument('--engine', choices=sorted(engine.ENGINES))
+    parser.add_argument('--train', choices=trains.train_names(),
+                        help='train for rows without one (default E80)')
+    parser.add_argument('--nth', type=int, metavar='N',
+                        help='also output envelopes at the n-th points')
+    parser.add_argument('--profile', action='store_true',
+                        help='print timings, counts and peak memory to '
+                        'stderr')
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or guess_format(args.input)
+    output_format = args.output_format or guess_format(args.output,
+                                                       input_format)
+    writer_type = JSONLWriter if output_format == 'jsonl' else CSVWriter
+
+    with open_stream(args.input, 'r') as source, \
+            open_stream(args.output, 'w') as sink:
+        if input_format == 'jsonl':
+            table = read_jsonl(source)
+            columns = None
+        else:
+            table = csv.DictReader(source)
+            columns = table.fieldnames or []
+        rows = collections.deque()
+        jobs = jobs_from_rows(table, args.nth, args.train)
+
+        def pool_jobs():
+            # Keep the raw rows in step with the jobs handed to the pool
+            for row, job in jobs:
+                rows.append(row)
+                yield job
+
+        # Any JSONL row can ask for an envelope with its own n
+        writer = writer_type(sink, args.nth is not None or columns is None
+                             or 'n' in columns, columns)
+        failures = 0
+        stats = profiling.Stats(trace_memory=True)
+        start = time.perf_counter()
+        outputs = batch.iter_batch(pool_jobs(), args.workers,
+                                   args.chunksize, args.engine,
+                                   profile=args.profile)
+        for output in outputs:
+            record = output_record(rows.popleft(), output)
+            failures += 'error' in record
+            writer.write(record)
+            sink.flush()
+            if args.profile and not isinstance(output, str):
+                stats.merge(output[2])
+
+    if args.profile:
+        # Phase times are summed over the workers, so they can add up to
+        # more than the wall time
+        print('%s wall | %s' % (profiling.format_seconds(
+            time.perf_counter() - start), stats.summary()), file=sys.stderr)
+    return 1 if failures else 0
@@ -0,0 +1,271 @@
+# Continuous beams.
+#
+# A girder continuous over interior piers (with the same EI throughout) is
+# solved by the flexibility method. Take the piers away and what is left
+# is one simple span over the whole length. The pier reactions are the
+# redundants that bring its deflection back to zero at each pier. The
+# flexibility matrix depends only on the span lengths, so it is factorized
+# once per structure, and Beam objects are cached by their span lengths.
+#
+# For a unit load at u the pier reactions are R(u) = F^-1 d(u). The moment
+# (or shear) at a section is then the long simple span's influence line
+# minus each pier reaction times that line's value at the pier. R(u) is
+# the same for every section. It is worked out once per sample grid and
+# cached, so all a section adds is its values at the piers, and its line
+# costs one small matrix product more than a simple span's. The lines go
+# through the same convolution as influence.load_effects, so a whole
+# envelope costs about what a simple-span one does.
+# Requires numpy.
+#
+#     python continuous.py 60 80 60 -n 10 --train E80
+
+import argparse
+import collections
+import functools
+import sys
+import threading
+
+import numpy as np
+
+import engine
+import influence
+import profiling
+import trains
+
+
+# Sample grids whose pier reactions are kept per beam. load_effects uses
+# one grid per axle group for the lines and two per uniform load for the
+# areas.
+CACHED_GRIDS = 4
+
+# Envelope at each section, as engine.Envelope, plus the largest negative
+# moment (over the piers, mostly) and the train positions that cause it.
+# Positions are of the front of the train past the far end of the beam.
+Envelope = collections.namedtuple('Envelope', engine.Envelope._fields
+                                  + ('min_moments', 'min_moment_positions'))
+
+
+def deflection(length, a, t):
+    # Deflection at t of a simple span of this length (EI = 1) under a unit
+    # load at a. By reciprocity it is also the deflection at a for a unit
+    # load at t.
+    t = np.asarray(t, dtype=float)
+    b = length - a
+    s = length - t
+    line = np.where(t <= a,
+                    b*t*(length*length - b*b - t*t),
+                    a*s*(length*length - a*a - s*s))/(6*length)
+    return np.where((0 < t) & (t < length), line, 0)
+
+
+def deflection_area(length, a, u):
+    # Area under deflection(length, a, t) from t = 0 to u
+    u = np.clip(u, 0, length)
+    b = length - a
+
+    def left(t):
+        return b*((length*length - b*b)*t*t/2 - t**4/4)
+
+    def right(s):
+        return a*((length*length - a*a)*s*s/2 - s**4/4)
+
+    return (left(np.minimum(u, a))
+            + np.where(u > a, right(b) - right(length - u), 0))/(6*length)
+
+
+class Beam:
+    # A beam continuous over spans (feet, left to right), on a support at
+    # each end and at every pier between spans. Use beam() to share one
+    # per structure.
+
+    def __init__(self, spans):
+        self.spans = tuple(float(span) for span in spans)
+        self.length = sum(self.spans)
+        self.supports = np.cumsum((0.0,) + self.spans)
+        self.piers = self.supports[1:-1]
+
+        # Deflection at each pier under a unit load at each pier. There are
+        # only ever a few piers, so inverting it once is as good as a
+        # factorization and makes each solve a matrix product.
+        flexibility = deflection(self.length, self.piers[None, :],
+                                 self.piers[:, None])
+        self.inverse = np.linalg.inv(flexibility)
+
+        self.lock = threading.Lock()
+        self.reaction_grids = collections.OrderedDict()
+        self.area_grids = collections.OrderedDict()
+        self.lines = ((self.moment_line, self.moment_area),
+                      (self.shear_line, self.shear_area),
+                      influence.SECTION)
+
+    def cached(self, grids, function, u):
+        # function(u), kept for the last few grids
+        key = (u.shape, u.tobytes())
+        with self.lock:
+            value = grids.pop(key, None)
+            if value is None:
+                value = function(u)
+            grids[key] = value
+            while len(grids) > CACHED_GRIDS:
+                grids.popitem(last=False)
+        return value
+
+    def reactions(self, u):
+        # Pier reactions for a unit load at each u, piers x len(u)
+        u = np.asarray(u, dtype=float)
+        return self.cached(
+            self.reaction_grids,
+            lambda u: self.inverse @ deflection(self.length,
+                                                self.piers[:, None], u), u)
+
+    def reaction_areas(self, u):
+        # Area under each pier's reaction line from the first support to u
+        u = np.asarray(u, dtype=float)
+        return self.cached(
+            self.area_grids,
+            lambda u: self.inverse @ deflection_area(self.length,
+                                                     self.piers[:, None], u),
+            u)
+
+    # Influence lines and their areas, as in influence.py but for the whole
+    # beam. span_length is only there to match; it is always the beam's
+    # length. Negative moment over the piers comes from the pier reaction
+    # terms.
+
+    def moment_line(self, span_length, x_loc, u):
+        return (influence.moment_line(self.length, x_loc, u)
+                - influence.moment_line(self.length, x_loc, self.piers)
+                @ self.reactions(u))
+
+    def shear_line(self, span_length, x_loc, u):
+        return (influence.shear_line(self.length, x_loc, u)
+                - influence.shear_line(self.length, x_loc, self.piers)
+                @ self.reactions(u))
+
+    def moment_area(self, span_length, x_loc, u):
+        return (influence.moment_area(self.length, x_loc, u)
+                - influence.moment_line(self.length, x_loc, self.piers)
+                @ self.reaction_areas(u))
+
+    def shear_area(self, span_length, x_loc, u):
+        return (influence.shear_area(self.length, x_loc, u)
+                - influence.shear_line(self.length, x_loc, self.piers)
+                @ self.reaction_areas(u))
+
+
+@functools.lru_cache(maxsize=32)
+def cached_beam(spans):
+    return Beam(spans)
+
+
+def beam(spans):
+    # The Beam for these span lengths, made once
+    engine.check_spans(spans)
+    return cached_beam(tuple(float(span) for span in spans))
+
+
+def nth_point_locs(spans, n):
+    # The n-th points of each span along the beam, and where to evaluate
+    # each. A pier appears twice, as the last point of one span and the
+    # first of the next; the second is evaluated just to the right of it
+    # (the next float up), so the shear on both sides is reported.
+    x_locs = []
+    at = []
+    start = 0.0
+    for i, span in enumerate(spans):
+        for k in range(n + 1):
+            x = start + k*span/n if k < n else start + span
+            x_locs.append(x)
+            at.append(np.nextafter(x, np.inf) if k == 0 and i else x)
+        start += span
+    return x_locs, at
+
+
+def unfactored_envelope(spans, n, increment=1, progress=None, train=None,
+                        stats=None):
+    structure = beam(spans)
+    x_locs, at = nth_point_locs(structure.spans, n)
+    with profiling.phase(stats, 'consist'):
+        consist = trains.get_train(train).consist(structure.length)
+
+    with profiling.phase(stats, 'sweep'):
+        positions, (m_arrays, v_arrays, at_arrays) = influence.load_effects(
+            structure.length, at, consist, increment, structure.lines,
+            progress)
+    for _ in x_locs:
+        engine.count_work(stats, positions, consist, 'influence')
+
+    # Rows are sections, so every section is reduced at once
+    with profiling.phase(stats, 'reduction'):
+        rows = np.arange(len(x_locs))
+
+        def extreme(arrays, find):
+            index = find(arrays, axis=1)
+            return (arrays[rows, index].tolist(),
+                    positions[index].tolist())
+
+        max_moments, moment_positions = extreme(m_arrays, np.argmax)
+        min_moments, min_moment_positions = extreme(m_arrays, np.argmin)
+        # The shear jumps by the load of an axle right at the section, so
+        # the maximum is taken with it to the right and the minimum with it
+        # to the left
+        max_shears, max_shear_positions = extreme(v_arrays, np.argmax)
+        min_shears, min_shear_positions = extreme(v_arrays - at_arrays,
+                                                  np.argmin)
+
+    return Envelope(x_locs, max_moments, moment_positions, max_shears,
+                    max_shear_positions, min_shears, min_shear_positions,
+                    min_moments, min_moment_positions)
+
+
+def envelope(spans, n=10, increment=1, impact_factor=0, dist_factor=1,
+             cache=None, progress=None, train=None, stats=None):
+    # Moment and shear envelopes at the n-th points of every span, from one
+    # pass over a shared position grid. cache, progress, train and stats
+    # are as for engine.envelope.
+    engine.check_spans(spans)
+    engine.check_inputs(min(spans), increment, n)
+    spans = [float(span) for span in spans]
+
+    with profiling.memory(stats):
+        result = Envelope(*engine.fetch(
+            cache, 'continuous_envelope',
+            [spans, n, increment, engine.train_key(train)],
+            lambda: unfactored_envelope(spans, n, increment, progress,
+                                        train, stats),
+            stats))
+
+    return engine.factor_envelope(result, impact_factor, dist_factor)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Moment and shear envelopes for a continuous beam.')
+    parser.add_argument('spans', nargs='+', type=float,
+                        help='span lengths in feet, left to right')
+    parser.add_argument('-n', type=int, default=10,
+                        help='number of divisions per span')
+    parser.add_argument('--increment', type=float, default=1,
+                        help='increment in inches')
+    parser.add_argument('--impact', type=float, default=0,
+                        help='impact factor')
+    parser.add_argument('--dist', type=float, default=1,
+                        help='distribution factor')
+    parser.add_argument('--train', choices=trains.train_names())
+    args = parser.parse_args(argv)
+
+    try:
+        result = envelope(args.spans, args.n, args.increment, args.impact,
+                          args.dist, train=args.train)
+    except ValueError as error:
+        parser.error(str(error))
+
+    print('%10s %12s %12s %10s %10s' % ('x, ft', '+M, k-ft', '-M, k-ft',
+                                        '+V, k', '-V, k'))
+    for row in zip(result.x_locs, result.max_moments, result.min_moments,
+                   result.max_shears, result.min_shears):
+        print('%10.2f %12.1f %12.1f %10.1f %10.1f' % row)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,889 @@
+# Headless moving-load engine for the Cooper E-80 calculator.
+#
+# Nothing in this module touches tkinter or matplotlib, so it can be
+# imported by batch scripts and workers on machines without a display.
+# All lengths are in feet, increments in inches and loads in kips. Trains
+# come from trains.py; E-80 is the default.
+
+import collections
+import importlib.util
+import math
+import operator
+
+import profiling
+import trains
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+else:
+    import influence
+
+# The compiled engine needs numba, which takes a quarter of a second to
+# import, so jit.py is only imported when that engine first runs
+numba_found = (np is not None
+               and importlib.util.find_spec('numba') is not None)
+
+
+# Factored maximums and the position of the front of the train (feet
+# past the last support) that causes them. precision is the spacing, in
+# inches, of the train positions the maximums were picked from (0 for the
+# exact engine, None if not known).
+Result = collections.namedtuple('Result', ['max_moment',
+                                           'moment_position',
+                                           'max_shear',
+                                           'shear_position',
+                                           'precision'])
+Result.__new__.__defaults__ = (None,)
+
+# Factored maximum moment, maximum positive and negative shear, and the
+# train positions that cause them, at each of the n-th points along the
+# span.
+Envelope = collections.namedtuple('Envelope', ['x_locs',
+                                               'max_moments',
+                                               'moment_positions',
+                                               'max_shears',
+                                               'max_shear_positions',
+                                               'min_shears',
+                                               'min_shear_positions'])
+
+
+class Cancelled(Exception):
+    # Raised from a progress callback to stop a calculation
+    pass
+
+
+def check_inputs(span_length, increment=1, n=1):
+    # Raise ValueError for input the sweep can't handle (a zero increment
+    # would never finish).
+    if not (math.isfinite(span_length) and math.isfinite(increment)):
+        raise ValueError('Span length and increment must be finite')
+    if span_length <= 0:
+        raise ValueError('Span length must be positive')
+    if increment <= 0:
+        raise ValueError('Increment must be positive')
+    if n < 1:
+        raise ValueError('Number of points must be at least 1')
+
+
+def check_spans(spans):
+    # Raise ValueError for a chain of spans (feet, in order) that can't be
+    # swept
+    if not spans:
+        raise ValueError('At least one span is needed')
+    if not all(math.isfinite(span) for span in spans):
+        raise ValueError('Span lengths must be finite')
+    if min(spans) <= 0:
+        raise ValueError('Span lengths must be positive')
+
+
+def resolve_x_loc(span_length, x_loc, x_is_fraction=False):
+    # Convert a span fraction to feet from the left support. Raises
+    # ValueError for a section that isn't on the span.
+    x_loc = x_loc * span_length if x_is_fraction else x_loc
+    if not 0 <= x_loc <= span_length:
+        raise ValueError('The section must be on the span')
+    return x_loc
+
+
+def train_positions(span_length, train_tot, increment):
+    # Positions of the front of the train, from the front axle sitting on
+    # the first support until the whole train has crossed.
+    incr = increment/12
+    positions = []
+    point = -span_length
+    while point <= train_tot:
+        positions.append(point)
+        point += incr
+    return positions
+
+
+def segment_effects(span_length, x_loc, load, rear, front):
+    # Moment and shear at x_loc from a uniform load spread from rear to
+    # front (distances from the first support), worked out in closed form
+    # over the part of it on the span
+    lo = min(max(rear, 0), span_length)
+    hi = min(max(front, 0), span_length)
+    r2 = load*(hi*hi - lo*lo)/(2*span_length)
+    r1 = load*(hi - lo) - r2
+    right_lo = max(lo, x_loc) - x_loc
+    right_hi = max(hi, x_loc) - x_loc
+    left = min(hi, x_loc) - min(lo, x_loc)
+    return (r2*(span_length - x_loc)
+            - load*(right_hi*right_hi - right_lo*right_lo)/2,
+            r1 - load*left)
+
+
+def segments_numpy(span_length, x_loc, segments, positions):
+    # Vectorized segment_effects summed over a train's segments
+    m_array = np.zeros(np.broadcast(x_loc, positions).shape)
+    v_array = np.zeros(m_array.shape)
+    for start, end, load in segments:
+        lo = np.clip(span_length + positions - end, 0, span_length)
+        hi = np.clip(span_length + positions - start, 0, span_length)
+        r2 = load*(hi*hi - lo*lo)/(2*span_length)
+        r1 = load*(hi - lo) - r2
+        right_lo = np.maximum(lo, x_loc) - x_loc
+        right_hi = np.maximum(hi, x_loc) - x_loc
+        left = np.minimum(hi, x_loc) - np.minimum(lo, x_loc)
+        m_array += (r2*(span_length - x_loc)
+                    - load*(right_hi*right_hi - right_lo*right_lo)/2)
+        v_array += r1 - load*left
+    return m_array, v_array
+
+
+def one_sided_shear(v_right, at_section):
+    # The shear jumps by the load of any axle right at the section as it
+    # passes, so take whichever side of the jump has the larger magnitude.
+    # v_right has those axles counted right of the section and at_section
+    # is their total load. (Axles right at a support are counted on the
+    # span, where they give the full reaction.)
+    if np is not None and isinstance(v_right, np.ndarray):
+        return np.where(2*v_right >= at_section, v_right,
+                        v_right - at_section)
+    return v_right if 2*v_right >= at_section else v_right - at_section
+
+
+def sweep_reference(span_length, x_loc, consist, increment, progress=None):
+    # Moment and shear at x_loc for each train position, one axle at a time
+    positions = train_positions(span_length, consist.length, increment)
+    m_array, v_array = effects_reference(span_length, x_loc, consist,
+                                         positions, progress)
+    return positions, m_array, v_array
+
+
+def effects_reference(span_length, x_loc, consist, positions,
+                      progress=None):
+    # Moment and shear at x_loc for the given train positions
+    axle_loads = consist.loads
+    offsets = consist.offsets
+    num_axles = len(axle_loads)
+    m_array = []
+    v_array = []
+
+    for i, position in enumerate(positions):
+        if progress is not None and i % 1024 == 0:
+            progress(i/len(positions))
+
+        r1_tot = 0
+        r2_tot = 0
+        m_tot = 0
+        v_tot = 0
+        v_at = 0
+
+        for j in range(num_axles):
+            a_val = span_length + position - offsets[j]
+            b_val = span_length - a_val
+
+            if 0 <= b_val <= span_length:
+                r1_tot += axle_loads[j]*b_val/span_length
+                if a_val > x_loc:
+                    m_tot += axle_loads[j]*(a_val - x_loc)
+                if a_val < x_loc:
+                    v_tot += axle_loads[j]
+                elif a_val == x_loc:
+                    v_at += axle_loads[j]
+
+            if 0 <= a_val <= span_length:
+                r2_tot += axle_loads[j]*a_val/span_length
+
+        m_val = r2_tot*(span_length - x_loc) - m_tot
+        v_val = r1_tot - v_tot
+
+        for start, end, load in consist.segments:
+            m_seg, v_seg = segment_effects(span_length, x_loc, load,
+                                           span_length + position - end,
+                                           span_length + position - start)
+            m_val += m_seg
+            v_val += v_seg
+
+        m_array.append(m_val)
+        v_array.append(one_sided_shear(v_val, v_at))
+
+    return m_array, v_array
+
+
+# Upper limit on the size of the positions x axles arrays built at once by
+# the numpy sweep, so long spans at fine increments don't exhaust memory.
+CHUNK_SIZE = 1 << 20
+
+
+def grid_size(span_length, train_tot, increment):
+    return int((train_tot + span_length)/(increment/12) + 1e-9) + 1
+
+
+def position_grid(span_length, train_tot, increment):
+    # Same positions as train_positions, built as an array
+    count = grid_size(span_length, train_tot, increment)
+    return -span_length + np.arange(count)*(increment/12)
+
+
+def sweep_numpy(span_length, x_loc, consist, increment, progress=None):
+    # Same sweep as sweep_reference, with every axle at a block of positions
+    # handled as one array operation.
+    positions = position_grid(span_length, consist.length, increment)
+    m_array, v_array = effects_numpy(span_length, x_loc, consist, positions,
+                                     progress)
+    return positions, m_array, v_array
+
+
+def effects_numpy(span_length, x_loc, consist, positions, progress=None):
+    # Vectorized effects_reference
+    loads = consist.arrays.loads
+    offsets = consist.arrays.offsets
+    positions = np.asarray(positions, dtype=float)
+    m_array, v_array = segments_numpy(span_length, x_loc, consist.segments,
+                                      positions)
+
+    rows = max(1, CHUNK_SIZE // max(len(loads), 1))
+    for start in range(0, len(positions), rows):
+        if progress is not None:
+            progress(start/len(positions))
+        stop = start + rows
+
+        # a and b hold the distance from each support to each axle, with
+        # one row per train position
+        a = span_length + positions[start:stop, None] - offsets
+        b = span_length - a
+
+        on_span = (0 <= b) & (b <= span_length)
+        on_loads = np.where(on_span, loads, 0)
+        r1 = (on_loads*b).sum(axis=1)/span_length
+        r2 = (np.where((0 <= a) & (a <= span_length), loads, 0)*a).sum(
+            axis=1)/span_length
+        m = np.where(a > x_loc, on_loads*(a - x_loc), 0).sum(axis=1)
+        v = np.where(a < x_loc, on_loads, 0).sum(axis=1)
+        at = np.where(a == x_loc, on_loads, 0).sum(axis=1)
+
+        m_array[start:stop] += r2*(span_length - x_loc) - m
+        v_array[start:stop] = one_sided_shear(v_array[start:stop] + r1 - v,
+                                              at)
+
+    return m_array, v_array
+
+
+def critical_positions(span_length, x_loc, consist):
+    # Train positions at which an axle or the edge of a uniform load
+    # reaches the first support, the section or the last support. Between
+    # these, moment and shear are linear in the train position (quadratic
+    # while a uniform load edge is on the span).
+    edges = list(consist.offsets)
+    for start, end, _ in consist.segments:
+        edges += [start] + ([end] if end != math.inf else [])
+    edges = np.asarray(edges, dtype=float)
+    train_tot = consist.length
+    events = np.concatenate([edges - span_length,
+                             edges - span_length + x_loc,
+                             edges,
+                             [-span_length, train_tot]])
+    events = events[(events >= -span_length) & (events <= train_tot)]
+    return np.unique(events)
+
+
+def vertices(f0, fm, f1, t0, t1):
+    # Position of the turning point of the parabola through the values at
+    # the start, middle and end of each piece, or nan where it is straight
+    # or turns outside the piece
+    curve = f0 - 2*fm + f1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = -(f1 - f0)*(t1 - t0)/(4*curve)
+    inside = (np.abs(curve) > 1e-9*(np.abs(fm) + 1)) \
+        & (np.abs(s) < (t1 - t0)/2)
+    return np.where(inside, (t0 + t1)/2 + s, np.nan)
+
+
+def sweep_exact(span_length, x_loc, consist, increment, progress=None):
+    # Moment and shear at both ends of every piece between critical
+    # positions, and at the turning points of the pieces that are curved
+    # by a uniform load. The increment is not used: the largest value
+    # returned is the true maximum, found wherever it lies. This is quick
+    # enough that progress isn't reported.
+    loads = consist.arrays.loads
+    offsets = consist.arrays.offsets
+    events = critical_positions(span_length, x_loc, consist)
+
+    # Which axles are on the span, and on which side of the section, is
+    # fixed within each piece, so find it at the middle of the piece
+    starts = events[:-1]
+    ends = events[1:]
+    mids = (starts + ends)/2
+    a_mid = span_length + mids[:, None] - offsets
+    on_loads = np.where((0 < a_mid) & (a_mid < span_length), loads, 0)
+    right_loads = np.where(a_mid > x_loc, on_loads, 0)
+    left_loads = np.where(a_mid < x_loc, on_loads, 0)
+
+    def piece_effects(positions):
+        # Effects at one position in each piece, with the axles taken as
+        # they are in the middle of the piece
+        a = span_length + positions[:, None] - offsets
+        r1 = (on_loads*(span_length - a)).sum(axis=1)/span_length
+        r2 = (on_loads*a).sum(axis=1)/span_length
+        m_seg, v_seg = segments_numpy(span_length, x_loc, consist.segments,
+                                      positions)
+        return (r2*(span_length - x_loc)
+                - (right_loads*(a - x_loc)).sum(axis=1) + m_seg,
+                r1 - left_loads.sum(axis=1) + v_seg)
+
+    m_start, v_start = piece_effects(starts)
+    m_mid, v_mid = piece_effects(mids)
+    m_end, v_end = piece_effects(ends)
+    positions = [starts, ends]
+    m_arrays = [m_start, m_end]
+    v_arrays = [v_start, v_end]
+    for values in ((m_start, m_mid, m_end), (v_start, v_mid, v_end)):
+        turns = vertices(*values, starts, ends)
+        curved = ~np.isnan(turns)
+        if curved.any():
+            m_turn, v_turn = piece_effects(np.where(curved, turns, mids))
+            positions.append(turns[curved])
+            m_arrays.append(m_turn[curved])
+            v_arrays.append(v_turn[curved])
+
+    return (np.concatenate(positions), np.concatenate(m_arrays),
+            np.concatenate(v_arrays))
+
+
+# Step of the first, coarse sweep of the adaptive engine, in inches, and
+# the number of peaks in each of the moment and shear histories that are
+# refined
+ADAPTIVE_COARSE_INCREMENT = 12
+ADAPTIVE_PEAKS = 4
+
+
+def peak_indexes(values, count):
+    # Indexes of the count largest local maxima
+    peaks = [i for i in range(len(values))
+             if (i == 0 or values[i] >= values[i - 1])
+             and (i == len(values) - 1 or values[i] >= values[i + 1])]
+    peaks.sort(key=lambda i: values[i], reverse=True)
+    return peaks[:count]
+
+
+def sweep_adaptive(span_length, x_loc, consist, increment, progress=None):
+    # Sweep at ADAPTIVE_COARSE_INCREMENT, then zoom in on the highest peaks
+    # of the moment, shear and negative shear histories, narrowing the
+    # window around the best position by a factor of 4 each time until the
+    # spacing is down to the increment. Returns every position looked at.
+    effects = effects_numpy if np is not None else effects_reference
+    train_tot = consist.length
+    target = increment/12
+    coarse = max(ADAPTIVE_COARSE_INCREMENT/12, target)
+
+    positions = train_positions(span_length, train_tot, coarse*12)
+    m_array, v_array = effects(span_length, x_loc, consist, positions)
+    positions = list(positions)
+    m_array = list(m_array)
+    v_array = list(v_array)
+
+    # Each candidate is a position with the history it is a peak of and
+    # the sign that makes the peak a maximum
+    candidates = []
+    for which, sign in ((0, 1), (1, 1), (1, -1)):
+        values = [sign*value for value in (m_array, v_array)[which]]
+        candidates += [(positions[i], which, sign)
+                       for i in peak_indexes(values, ADAPTIVE_PEAKS)]
+
+    for k, (best, which, sign) in enumerate(candidates):
+        if progress is not None:
+            progress(k/len(candidates))
+        step = coarse
+        while step > target:
+            step = max(step/4, target)
+            window = [min(max(best + i*step, -span_length), train_tot)
+                      for i in range(-4, 5)]
+            m_window, v_window = effects(span_length, x_loc, consist,
+                                         window)
+            values = [sign*value for value in (m_window, v_window)[which]]
+            best = window[max_index(values)[0]]
+            positions += window
+            m_array += list(m_window)
+            v_array += list(v_window)
+
+    return positions, m_array, v_array
+
+
+def sweep_influence(span_length, x_loc, consist, increment, progress=None):
+    # Single-section version of the influence-line engine
+    positions, (m_arrays, v_arrays, at_arrays) = influence.load_effects(
+        span_length, [x_loc], consist, increment, influence.SECTION_LINES,
+        progress)
+    return positions, m_arrays[0], one_sided_shear(v_arrays[0],
+                                                   at_arrays[0])
+
+
+# The axles on the span at any position are a contiguous run of the sorted
+# offsets, and so are the ones each side of the section. With running sums
+# of the loads and of load x offset, the reactions and the moment and shear
+# from a run of axles come from the sums at its ends. Each position then
+# costs the same however many axles the train has.
+
+# Train positions the numpy window sweep works on at a time. Blocks this
+# size keep the temporaries in cache and report progress often.
+WINDOW_BLOCK = 1 << 15
+
+
+def effects_window(span_length, x_loc, consist, positions, progress=None):
+    # Same as effects_reference, for positions in increasing order. The
+    # ends of the runs only move forward as the train does, so they are
+    # found by stepping pointers along the offsets.
+    offsets = consist.offsets
+    num_axles = len(offsets)
+    sums, moments = consist.sums
+    lo = hi = right = left = 0
+    m_array = []
+    v_array = []
+
+    for i, position in enumerate(positions):
+        if progress is not None and i % 1024 == 0:
+            progress(i/len(positions))
+
+        # Axles lo to hi are on the span (including any right at a
+        # support). Axles from lo up to right are right of the section, from
+        # right up to left at it and from left up to hi left of it.
+        front = span_length + position
+        cut = front - x_loc
+        while lo < num_axles and offsets[lo] < position:
+            lo += 1
+        while hi < num_axles and offsets[hi] <= front:
+            hi += 1
+        while right < num_axles and offsets[right] < cut:
+            right += 1
+        while left < num_axles and offsets[left] <= cut:
+            left += 1
+        r = max(right, lo)
+        l = min(left, hi)
+
+        on_load = sums[hi] - sums[lo]
+        r2_tot = (on_load*front - moments[hi] + moments[lo])/span_length
+        m_val = (r2_tot*(span_length - x_loc)
+                 - (sums[r] - sums[lo])*cut + moments[r] - moments[lo])
+        v_val = on_load - r2_tot - sums[hi] + sums[l]
+        v_at = sums[l] - sums[r] if l > r else 0
+
+        for start, end, load in consist.segments:
+            m_seg, v_seg = segment_effects(span_length, x_loc, load,
+                                           front - end, front - start)
+            m_val += m_seg
+            v_val += v_seg
+
+        m_array.append(m_val)
+        v_array.append(one_sided_shear(v_val, v_at))
+
+    return m_array, v_array
+
+
+def window_sweeps(span_length, x_locs, consist, increment, progress=None):
+    # Positions with the moment and shear histories at each section in
+    # turn, with numpy. Everything that doesn't depend on the section (the
+    # run of axles on the span, found by binary search, which numpy does
+    # faster than it could step pointers, the reactions, and how much of
+    # each uniform load is on the span) is worked out once and shared by
+    # all the sections. Positions are taken WINDOW_BLOCK at a time, so the
+    # temporary arrays stay small and progress is reported (and Cancelled
+    # can be raised) after every block.
+    positions = position_grid(span_length, consist.length, increment)
+    count = len(positions)
+    arrays = consist.arrays
+    offsets, sums, moments = arrays.offsets, arrays.sums, arrays.moments
+    blocks = range(0, count, WINDOW_BLOCK)
+    steps = (len(x_locs) + 1)*len(blocks)
+    done = 0
+
+    lo = np.empty(count, dtype=np.intp)
+    hi = np.empty(count, dtype=np.intp)
+    r1 = np.empty(count)
+    r2 = np.empty(count)
+    # Ends of the part of each uniform load on the span, as in
+    # segments_numpy
+    segments = [(np.empty(count), np.empty(count), load)
+                for _, _, load in consist.segments]
+    for start in blocks:
+        if progress is not None:
+            progress(done/steps)
+        done += 1
+        block = slice(start, start + WINDOW_BLOCK)
+        front = span_length + positions[block]
+        lo[block] = np.searchsorted(offsets, positions[block], 'left')
+        hi[block] = np.searchsorted(offsets, front, 'right')
+        on_load = sums[hi[block]] - sums[lo[block]]
+        r2[block] = (on_load*front - moments[hi[block]]
+                     + moments[lo[block]])/span_length
+        r1[block] = on_load - r2[block]
+        for (seg_start, seg_end, load), (seg_lo, seg_hi, _) in zip(
+                consist.segments, segments):
+            seg_lo[block] = np.clip(front - seg_end, 0, span_length)
+            seg_hi[block] = np.clip(front - seg_start, 0, span_length)
+            seg_r2 = load*(seg_hi[block]**2 - seg_lo[block]**2)/(
+                2*span_length)
+            r2[block] += seg_r2
+            r1[block] += load*(seg_hi[block] - seg_lo[block]) - seg_r2
+
+    for x_loc in x_locs:
+        m_array = np.empty(count)
+        v_array = np.empty(count)
+        for start in blocks:
+            if progress is not None:
+                progress(done/steps)
+            done += 1
+            block = slice(start, start + WINDOW_BLOCK)
+            block_lo = lo[block]
+            block_hi = hi[block]
+            cut = span_length + positions[block] - x_loc
+            r = np.maximum(np.searchsorted(offsets, cut, 'left'), block_lo)
+            l = np.minimum(np.searchsorted(offsets, cut, 'right'), block_hi)
+            m_block = (r2[block]*(span_length - x_loc)
+                       - (sums[r] - sums[block_lo])*cut
+                       + moments[r] - moments[block_lo])
+            v_block = r1[block] - sums[block_hi] + sums[l]
+            for seg_lo, seg_hi, load in segments:
+                right_lo = np.maximum(seg_lo[block], x_loc) - x_loc
+                right_hi = np.maximum(seg_hi[block], x_loc) - x_loc
+                m_block -= load*(right_hi*right_hi - right_lo*right_lo)/2
+                v_block -= load*(np.minimum(seg_hi[block], x_loc)
+                                 - np.minimum(seg_lo[block], x_loc))
+            at = np.where(l > r, sums[l] - sums[r], 0)
+            m_array[block] = m_block
+            v_array[block] = one_sided_shear(v_block, at)
+        yield positions, m_array, v_array
+
+
+def sweep_window(span_length, x_loc, consist, increment, progress=None):
+    # Running-sum sweep: numpy if it is there, otherwise pointers stepped
+    # along the axles in pure Python
+    if np is not None:
+        return next(window_sweeps(span_length, [x_loc], consist, increment,
+                                  progress))
+    positions = train_positions(span_length, consist.length, increment)
+    m_array, v_array = effects_window(span_length, x_loc, consist,
+                                      positions, progress)
+    return positions, m_array, v_array
+
+
+def sweep_jit(span_length, x_loc, consist, increment, progress=None):
+    # The running-sum sweep compiled with numba (jit.py)
+    import jit
+    positions = position_grid(span_length, consist.length, increment)
+    m_array = np.empty(len(positions))
+    v_array = np.empty(len(positions))
+    args = jit.kernel_args(consist)
+    for start in range(0, len(positions), CHUNK_SIZE):
+        if progress is not None:
+            progress(start/len(positions))
+        stop = min(start + CHUNK_SIZE, len(positions))
+        jit.sweep_kernel(span_length, x_loc, *args, increment/12, start,
+                         stop, m_array[start:stop], v_array[start:stop])
+    return positions, m_array, v_array
+
+
+def maxima_jit(span_length, x_loc, consist, increment, progress=None):
+    # Maximum moment and absolute shear with their positions, and the
+    # number of positions looked at, from the compiled loop without
+    # keeping the histories
+    import jit
+    count = grid_size(span_length, consist.length, increment)
+    incr = increment/12
+    args = jit.kernel_args(consist)
+    empty = np.empty(0)
+    m_max = v_max = -math.inf
+    m_index = v_index = 0
+    for start in range(0, count, CHUNK_SIZE):
+        if progress is not None:
+            progress(start/count)
+        stop = min(start + CHUNK_SIZE, count)
+        m_best, m_at, v_best, v_at = jit.sweep_kernel(
+            span_length, x_loc, *args, incr, start, stop, empty, empty)
+        if m_best > m_max:
+            m_max, m_index = m_best, m_at
+        if v_best > v_max:
+            v_max, v_index = v_best, v_at
+    return (m_max, -span_length + m_index*incr, v_max,
+            -span_length + v_index*incr, count)
+
+
+# Sweep implementations by name. Each takes the span, section,
+# trains.Consist and increment and returns the train positions with the
+# moment and (signed) shear at the section for each of them. They also take
+# an optional progress callback, called now and then with the fraction
+# done; it can raise Cancelled to stop the sweep.
+ENGINES = {'reference': sweep_reference, 'adaptive': sweep_adaptive,
+           'window': sweep_window}
+if np is not None:
+    ENGINES['numpy'] = sweep_numpy
+    ENGINES['exact'] = sweep_exact
+    ENGINES['influence'] = sweep_influence
+if numba_found:
+    ENGINES['jit'] = sweep_jit
+
+# Engines that can find the maximums at a section without keeping the
+# histories. Each returns the maximum moment and absolute shear, the
+# positions that cause them and the number of positions looked at.
+MAXIMA = {}
+if numba_found:
+    MAXIMA['jit'] = maxima_jit
+
+# Engines that keep running sums of the loads, so each position costs the
+# same however many axles the train has
+RUNNING_SUM_ENGINES = ('window', 'jit')
+
+# The default is the first of these that is available. The compiled
+# engine is the quickest when numba is installed, for one section or all
+# the n-th points, then the running-sum one, which needs nothing.
+FASTEST = ['jit', 'window']
+DEFAULT_ENGINE = next(name for name in FASTEST if name in ENGINES)
+DEFAULT_ENVELOPE_ENGINE = DEFAULT_ENGINE
+
+
+def get_engine(name=None):
+    try:
+        return ENGINES[name or DEFAULT_ENGINE]
+    except KeyError:
+        raise ValueError('Unknown engine: ' + str(name))
+
+
+def max_index(values):
+    # Index and value of the first maximum
+    if np is not None and isinstance(values, np.ndarray):
+        index = int(np.argmax(values))
+        return index, float(values[index])
+    return max(enumerate(values), key=operator.itemgetter(1))
+
+
+def min_index(values):
+    # Index and value of the first minimum
+    if np is not None and isinstance(values, np.ndarray):
+        index = int(np.argmin(values))
+        return index, float(values[index])
+    return min(enumerate(values), key=operator.itemgetter(1))
+
+
+def abs_values(values):
+    if np is not None and isinstance(values, np.ndarray):
+        return np.abs(values)
+    return [abs(value) for value in values]
+
+
+def engine_name(engine=None):
+    return engine or DEFAULT_ENGINE
+
+
+def engine_precision(engine, increment):
+    # Spacing of the positions the engine picks the maximum from. The
+    # adaptive engine refines until it reaches the increment.
+    if engine_name(engine) == 'exact':
+        return 0.0
+    return increment
+
+
+def train_key(train=None):
+    # Identifies the train for result caching
+    return trains.get_train(train).key
+
+
+def result_params(span_length, x_loc, increment=1, engine=None, train=None):
+    # Everything an unfactored result depends on, as a cache key
+    return [span_length, x_loc, increment, engine_name(engine),
+            train_key(train)]
+
+
+def axle_evaluations(engine, positions, consist):
+    # Roughly how many axle loads a sweep over this many positions looks
+    # at. The running-sum engines go over the axles once to make the sums
+    # and then do a fixed amount of work per position.
+    if engine_name(engine) in RUNNING_SUM_ENGINES:
+        return positions + len(consist.loads)
+    return positions*len(consist.loads)
+
+
+def count_work(stats, positions, consist, engine=None):
+    # Positions looked at, and the axle evaluations the engine needed for
+    # them
+    if stats is not None:
+        stats.count('positions', len(positions))
+        stats.count('axle_evaluations',
+                    axle_evaluations(engine, len(positions), consist))
+
+
+def unfactored_result(span_length, x_loc, increment=1, engine=None,
+                      progress=None, train=None, stats=None):
+    sweep = get_engine(engine)
+    with profiling.phase(stats, 'consist'):
+        consist = trains.get_train(train).consist(span_length)
+
+    maxima = MAXIMA.get(engine_name(engine))
+    if maxima is not None:
+        with profiling.phase(stats, 'sweep'):
+            m_max, m_position, v_max, v_position, count = maxima(
+                span_length, x_loc, consist, increment, progress)
+        count_work(stats, range(count), consist, engine)
+        return Result(float(m_max), float(m_position), float(v_max),
+                      float(v_position), engine_precision(engine, increment))
+
+    with profiling.phase(stats, 'sweep'):
+        positions, m_array, v_array = sweep(span_length, x_loc, consist,
+                                            increment, progress)
+    count_work(stats, positions, consist, engine)
+
+    # Find max and position of train to cause max
+    with profiling.phase(stats, 'reduction'):
+        m_loc_index, m_max = max_index(m_array)
+        v_loc_index, v_max = max_index(abs_values(v_array))
+
+    return Result(float(m_max), float(positions[m_loc_index]),
+                  float(v_max), float(positions[v_loc_index]),
+                  engine_precision(engine, increment))
+
+
+def fetch(cache, kind, params, compute, stats=None):
+    # cache.fetch, noting the hit or miss in stats. Without a cache the
+    # value is just computed.
+    if cache is None:
+        return compute()
+    value = cache.lookup(kind, params)
+    if stats is not None:
+        stats.cache_lookup(value is not None)
+    if value is None:
+        value = compute()
+        cache.store(kind, params, value)
+    return value
+
+
+def factor_result(result, impact_factor=0, dist_factor=1):
+    # Impact and distribution factors only scale the maximums
+    return result._replace(
+        max_moment=result.max_moment*(1 + impact_factor)*dist_factor,
+        max_shear=result.max_shear*(1 + impact_factor)*dist_factor)
+
+
+def calculate(span_length, x_loc, increment=1, impact_factor=0,
+              dist_factor=1, x_is_fraction=False, engine=None, cache=None,
+              progress=None, train=None, stats=None):
+    # cache can be a cache.ResultCache; unfactored results are stored so
+    # changing only the factors doesn't rerun the sweep. progress is passed
+    # on to the sweep. train is a trains.Train or the name of one (the
+    # default is E-80). stats, a profiling.Stats, collects timings and
+    # counts.
+    check_inputs(span_length, increment)
+    x_loc = resolve_x_loc(span_length, x_loc, x_is_fraction)
+
+    with profiling.memory(stats):
+        result = Result(*fetch(
+            cache, 'calculate',
+            result_params(span_length, x_loc, increment, engine, train),
+            lambda: unfactored_result(span_length, x_loc, increment,
+                                      engine, progress, train, stats),
+            stats))
+
+    return factor_result(result, impact_factor, dist_factor)
+
+
+def history(span_length, x_loc, increment=1, impact_factor=0,
+            dist_factor=1, x_is_fraction=False, engine=None, progress=None,
+            train=None):
+    # Every train position the engine looked at, in order, with the
+    # factored moment and signed shear at the section for each
+    check_inputs(span_length, increment)
+    x_loc = resolve_x_loc(span_length, x_loc, x_is_fraction)
+    consist = trains.get_train(train).consist(span_length)
+    positions, m_array, v_array = get_engine(engine)(
+        span_length, x_loc, consist, increment, progress)
+
+    order = sorted(range(len(positions)), key=positions.__getitem__)
+    factor = (1 + impact_factor)*dist_factor
+    return ([positions[i] for i in order],
+            [m_array[i]*factor for i in order],
+            [v_array[i]*factor for i in order])
+
+
+def nth_point_locs(span_length, n):
+    return [i*span_length/n for i in range(n+1)]
+
+
+def section_sweeps(span_length, x_locs, consist, increment, engine=None,
+                   progress=None):
+    # Train positions with the moment and shear histories at each section.
+    # The influence-line engine does all the sections in one pass and the
+    # window engine shares everything but the section's own terms; the
+    # others are run once per section with the same train.
+    engine = engine or DEFAULT_ENVELOPE_ENGINE
+    sweep = get_engine(engine)
+    if engine == 'window' and np is not None:
+        yield from window_sweeps(span_length, x_locs, consist, increment,
+                                 progress)
+        return
+    if engine == 'influence':
+        positions, (m_arrays, v_arrays, at_arrays) = influence.load_effects(
+            span_length, x_locs, consist, increment,
+            influence.SECTION_LINES, progress)
+        for m_array, v_array, at in zip(m_arrays, v_arrays, at_arrays):
+            yield positions, m_array, one_sided_shear(v_array, at)
+        return
+
+    for i, loc in enumerate(x_locs):
+        if progress is not None:
+            progress(i/len(x_locs))
+        yield sweep(span_length, loc, consist, increment)
+
+
+def unfactored_envelope(span_length, n, increment=1, engine=None,
+                        progress=None, train=None, stats=None):
+    x_locs = nth_point_locs(span_length, n)
+    with profiling.phase(stats, 'consist'):
+        consist = trains.get_train(train).consist(span_length)
+
+    envelope = Envelope(x_locs, [], [], [], [], [], [])
+    sweeps = section_sweeps(span_length, x_locs, consist, increment, engine,
+                            progress)
+    while True:
+        with profiling.phase(stats, 'sweep'):
+            histories = next(sweeps, None)
+        if histories is None:
+            break
+        positions, m_array, v_array = histories
+        count_work(stats, positions, consist,
+                   engine or DEFAULT_ENVELOPE_ENGINE)
+
+        with profiling.phase(stats, 'reduction'):
+            m_index, m_max = max_index(m_array)
+            v_index, v_max = max_index(v_array)
+            w_index, v_min = min_index(v_array)
+        envelope.max_moments.append(m_max)
+        envelope.moment_positions.append(float(positions[m_index]))
+        envelope.max_shears.append(v_max)
+        envelope.max_shear_positions.append(float(positions[v_index]))
+        envelope.min_shears.append(v_min)
+        envelope.min_shear_positions.append(float(positions[w_index]))
+
+    return envelope
+
+
+def factor_envelope(envelope, impact_factor=0, dist_factor=1):
+    # Any envelope (this module's, continuous's or reactions') with the
+    # factors applied to its max_ and min_ value lists; the positions are
+    # left alone
+    def scale(values):
+        return [value*(1 + impact_factor)*dist_factor for value in values]
+
+    return envelope._replace(**{
+        name: scale(getattr(envelope, name)) for name in envelope._fields
+        if name.startswith(('max_', 'min_'))
+        and not name.endswith('_positions')})
+
+
+def envelope(span_length, n, increment=1, impact_factor=0, dist_factor=1,
+             engine=None, cache=None, progress=None, train=None,
+             stats=None):
+    # Moment and shear envelopes at the n-th points, from one pass over a
+    # shared position grid
+    check_inputs(span_length, increment, n)
+
+    with profiling.memory(stats):
+        result = Envelope(*fetch(
+            cache, 'envelope',
+            [span_length, n, increment,
+             engine or DEFAULT_ENVELOPE_ENGINE, train_key(train)],
+            lambda: unfactored_envelope(span_length, n, increment, engine,
+                                        progress, train, stats),
+            stats))
+
+    return factor_envelope(result, impact_factor, dist_factor)
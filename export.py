@@ -0,0 +1,346 @@
+# Columnar export.
+#
+# Full moment/shear histories, n-th point envelopes and results are
+# written as typed columns: .npz, or Arrow IPC (.arrow) and Parquet
+# (.parquet) when pyarrow is installed. A ColumnWriter takes the columns a
+# chunk at a time, so a large batch is written as it is calculated. Chunks
+# at least chunk_rows long go straight to the file. Smaller ones are
+# gathered into one chunk first.
+#
+# The engine's arrays are handed over as they are. Factors are applied in
+# place, and numpy writes the arrays out directly while pyarrow wraps
+# float arrays without copying them. Nothing goes through text.
+#
+#     python export.py cases.csv -o histories.parquet
+#     python export.py cases.csv -o envelopes.npz --what envelopes --nth 20
+#
+# read() loads any of the files back as numpy arrays.
+
+import argparse
+import collections
+import json
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+import batch
+import cli
+import engine
+import trains
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+FORMATS = {'.npz': 'npz', '.arrow': 'arrow', '.feather': 'arrow',
+           '.parquet': 'parquet'}
+
+# Chunks shorter than this many rows are gathered before writing
+CHUNK_ROWS = 1 << 16
+
+METADATA_KEY = 'mvcalc'
+
+
+def guess_format(path):
+    try:
+        return FORMATS[os.path.splitext(path)[1].lower()]
+    except KeyError:
+        raise ValueError('Unknown export format: ' + path)
+
+
+def history_columns(span_length, x_loc, increment=1, impact_factor=0,
+                    dist_factor=1, x_is_fraction=False, engine_name=None,
+                    train=None):
+    # Factored moment and shear at the section for every train position
+    # the engine looked at, in position order, as the engine's own arrays
+    engine.check_inputs(span_length, increment)
+    x_loc = engine.resolve_x_loc(span_length, x_loc, x_is_fraction)
+    consist = trains.get_train(train).consist(span_length)
+    positions, m_array, v_array = engine.get_engine(engine_name)(
+        span_length, x_loc, consist, increment)
+    positions = np.asarray(positions, dtype=float)
+    m_array = np.asarray(m_array, dtype=float)
+    v_array = np.asarray(v_array, dtype=float)
+
+    # Only the exact and adaptive engines give positions out of order
+    if np.any(positions[1:] < positions[:-1]):
+        order = np.argsort(positions, kind='stable')
+        positions, m_array, v_array = (positions[order], m_array[order],
+                                       v_array[order])
+    factor = (1 + impact_factor)*dist_factor
+    if factor != 1:
+        m_array *= factor
+        v_array *= factor
+    return collections.OrderedDict([('position', positions),
+                                    ('moment', m_array),
+                                    ('shear', v_array)])
+
+
+def envelope_columns(envelope):
+    # One column per field of an envelope (engine, continuous or
+    # reactions), one row per point
+    return collections.OrderedDict(
+        (field, np.asarray(values, dtype=float))
+        for field, values in envelope._asdict().items())
+
+
+def result_columns(results):
+    # One column per engine.Result field, one row per result
+    return collections.OrderedDict(
+        (field, np.array([getattr(result, field) for result in results],
+                         dtype=float))
+        for field in engine.Result._fields)
+
+
+def with_case(cases, columns):
+    # columns with a leading column of case numbers: cases is one number
+    # for every row or the first of a run
+    length = len(next(iter(columns.values())))
+    numbers = (np.full(length, cases, dtype=np.int32)
+               if not isinstance(cases, tuple)
+               else np.arange(cases[0], cases[0] + length, dtype=np.int32))
+    return collections.OrderedDict([('case', numbers)]
+                                   + list(columns.items()))
+
+
+class ColumnWriter:
+    # Writes a table a chunk at a time. Each chunk is a dict of equal
+    # length 1-D arrays with the same names every time. metadata is any
+    # JSON-able dict, stored with the table.
+
+    def __init__(self, path, format=None, metadata=None,
+                 chunk_rows=CHUNK_ROWS):
+        self.path = path
+        self.format = format or guess_format(path)
+        if self.format not in FORMATS.values():
+            raise ValueError('Unknown export format: ' + str(self.format))
+        if self.format != 'npz' and pa is None:
+            raise ValueError('Arrow and Parquet export need pyarrow')
+        self.metadata = metadata or {}
+        self.chunk_rows = chunk_rows
+        self.names = None
+        self.pending = []
+        self.pending_rows = 0
+        self.chunks = 0
+        self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, columns):
+        columns = collections.OrderedDict(
+            (name, np.asarray(values)) for name, values in columns.items())
+        if self.names is None:
+            self.names = list(columns)
+        elif list(columns) != self.names:
+            raise ValueError('Every chunk needs the same columns')
+        rows = len(columns[self.names[0]])
+        if any(len(values) != rows for values in columns.values()):
+            raise ValueError('Columns must all be the same length')
+
+        if rows >= self.chunk_rows and not self.pending:
+            self.write_chunk(columns)
+            return
+        self.pending.append(columns)
+        self.pending_rows += rows
+        if self.pending_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        # Write out any gathered chunks as one
+        if not self.pending:
+            return
+        if len(self.pending) == 1:
+            columns = self.pending[0]
+        else:
+            columns = collections.OrderedDict(
+                (name, np.concatenate([chunk[name]
+                                       for chunk in self.pending]))
+                for name in self.names)
+        self.pending = []
+        self.pending_rows = 0
+        self.write_chunk(columns)
+
+    def write_chunk(self, columns):
+        if self.format == 'npz':
+            if self.writer is None:
+                self.writer = zipfile.ZipFile(self.path, 'w',
+                                              zipfile.ZIP_STORED,
+                                              allowZip64=True)
+            for name, values in columns.items():
+                self.write_member('%s/%06d' % (name, self.chunks), values)
+        else:
+            table = pa.Table.from_arrays(
+                [pa.array(values) for values in columns.values()],
+                names=self.names)
+            if self.writer is None:
+                self.schema = table.schema.with_metadata(
+                    {METADATA_KEY: json.dumps(self.metadata)})
+                if self.format == 'parquet':
+                    self.writer = pq.ParquetWriter(self.path, self.schema)
+                else:
+                    self.writer = pa.ipc.new_file(self.path, self.schema)
+            self.writer.write_table(table.cast(self.schema))
+        self.chunks += 1
+
+    def write_member(self, name, values):
+        with self.writer.open(name + '.npy', 'w', force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(values),
+                                      allow_pickle=False)
+
+    def close(self):
+        self.flush()
+        if self.format == 'npz':
+            if self.writer is None:
+                self.writer = zipfile.ZipFile(self.path, 'w')
+            self.write_member('__table__', np.array(json.dumps(
+                {'columns': self.names or [], 'chunks': self.chunks,
+                 'metadata': self.metadata})))
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def write(path, columns, format=None, metadata=None):
+    # A whole table in one go
+    with ColumnWriter(path, format, metadata, chunk_rows=0) as writer:
+        writer.write(columns)
+
+
+def read(path, format=None):
+    # The columns of an exported table as numpy arrays, and its metadata
+    format = format or guess_format(path)
+    if format == 'npz':
+        with np.load(path, allow_pickle=False) as data:
+            table = json.loads(str(data['__table__']))
+            columns = collections.OrderedDict()
+            for name in table['columns']:
+                chunks = [data['%s/%06d' % (name, k)]
+                          for k in range(table['chunks'])]
+                columns[name] = (chunks[0] if len(chunks) == 1
+                                 else np.concatenate(chunks))
+            return columns, table['metadata']
+
+    if pa is None:
+        raise ValueError('Arrow and Parquet export need pyarrow')
+    if format == 'parquet':
+        table = pq.read_table(path)
+    else:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    metadata = json.loads((table.schema.metadata or {}).get(
+        METADATA_KEY.encode(), b'{}'))
+    return (collections.OrderedDict(
+        (name, table.column(name).to_numpy()) for name in table.column_names),
+        metadata)
+
+
+def case_metadata(kind, engine_name, **more):
+    metadata = {'kind': kind, 'engine': engine.engine_name(engine_name)}
+    metadata.update(more)
+    return metadata
+
+
+def export_histories(path, cases, engine_name=None, format=None,
+                     progress=None):
+    # Every case's history, in order, with a case column numbering them.
+    # progress is called with the number of cases done.
+    with ColumnWriter(path, format,
+                      case_metadata('histories', engine_name)) as writer:
+        for k, case in enumerate(cases):
+            case = batch.make_case(case)
+            writer.write(with_case(k, history_columns(
+                case.span_length, case.x_loc, case.increment,
+                case.impact_factor, case.dist_factor, case.x_is_fraction,
+                engine_name, case.train)))
+            if progress is not None:
+                progress(k + 1)
+
+
+def export_envelopes(path, cases, n, engine_name=None, format=None,
+                     progress=None):
+    # Every case's n-th point envelope, with a case column
+    with ColumnWriter(path, format,
+                      case_metadata('envelopes', engine_name, n=n)) as writer:
+        for k, case in enumerate(cases):
+            case = batch.make_case(case)
+            writer.write(with_case(k, envelope_columns(engine.envelope(
+                case.span_length, n, case.increment, case.impact_factor,
+                case.dist_factor, engine_name, train=case.train))))
+            if progress is not None:
+                progress(k + 1)
+
+
+def export_results(path, cases, engine_name=None, format=None,
+                   workers=None, progress=None):
+    # Every case's result, calculated on the process pool and written a
+    # chunk at a time. Raises ValueError for a bad case.
+    with ColumnWriter(path, format,
+                      case_metadata('results', engine_name)) as writer:
+        jobs = ((case, None) for case in cases)
+        chunk = []
+        done = 0
+        for output in batch.iter_batch(jobs, workers,
+                                       engine_name=engine_name):
+            if isinstance(output, str):
+                raise ValueError('Case %d: %s' % (done, output))
+            chunk.append(output[0])
+            done += 1
+            if len(chunk) == CHUNK_ROWS:
+                writer.write(with_case((done - len(chunk),),
+                                       result_columns(chunk)))
+                chunk = []
+            if progress is not None:
+                progress(done)
+        if chunk:
+            writer.write(with_case((done - len(chunk),),
+                                   result_columns(chunk)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Export histories, envelopes or results for a file of '
+        'span cases as columns.')
+    parser.add_argument('input', help='CSV or JSONL cases, as for mvcalc.py')
+    parser.add_argument('-o', '--output', required=True,
+                        help='.npz, .arrow or .parquet file')
+    parser.add_argument('--what', choices=['histories', 'envelopes',
+                                           'results'], default='histories')
+    parser.add_argument('--nth', type=int, default=10,
+                        help='n-th points for envelopes')
+    parser.add_argument('--engine', choices=sorted(engine.ENGINES))
+    parser.add_argument('--train', choices=trains.train_names(),
+                        help='train for rows without one (default E80)')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes for results')
+    args = parser.parse_args(argv)
+
+    reader = (cli.read_jsonl if cli.guess_format(args.input) == 'jsonl'
+              else cli.read_csv)
+    try:
+        with cli.open_stream(args.input, 'r') as source:
+            # Rows are read as the export goes, so only the current chunk
+            # of cases is ever in memory
+            cases = (cli.parse_row(row, None, args.train)[0]
+                     for row in reader(source))
+            if args.what == 'histories':
+                export_histories(args.output, cases, args.engine)
+            elif args.what == 'envelopes':
+                export_envelopes(args.output, cases, args.nth, args.engine)
+            else:
+                export_results(args.output, cases, args.engine,
+                               workers=args.workers)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
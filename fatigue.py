@@ -0,0 +1,257 @@
+# Fatigue.
+#
+# The moment or shear history at a section for each train passage is
+# reduced to its reversals (peaks and valleys). The reversals are fed
+# through an online rainflow counter, which only ever holds the reversals
+# of cycles still open, so a traffic sequence of any length is counted in
+# memory that grows with the number of open peaks, not with the number of
+# passages. A train's reversals are worked out once and reused for every
+# passage of it. Closed cycles go into a histogram of stress ranges. The
+# Miner's rule damage sum is built up as they are counted:
+#
+#     python fatigue.py 100 50 --trains E80 "E80 Alternate" --repeat 10000
+#
+# Stresses are the load effect times stress_factor (12/S, in ksi per
+# kip-ft, for moment on a section modulus of S in^3, say).
+# Requires numpy.
+
+import argparse
+import collections
+import sys
+
+import numpy as np
+
+import engine
+import trains
+
+
+# S-N curve N = coefficient/range**exponent cycles to failure, with the
+# constant-amplitude fatigue threshold (ksi)
+SNCurve = collections.namedtuple('SNCurve', ['coefficient',
+                                             'exponent',
+                                             'threshold'])
+
+# AREMA/AASHTO detail categories (coefficient in ksi^3)
+DETAIL_CATEGORIES = collections.OrderedDict([
+    ('A', SNCurve(250e8, 3, 24)),
+    ('B', SNCurve(120e8, 3, 16)),
+    ("B'", SNCurve(61e8, 3, 12)),
+    ('C', SNCurve(44e8, 3, 10)),
+    ("C'", SNCurve(44e8, 3, 12)),
+    ('D', SNCurve(22e8, 3, 7)),
+    ('E', SNCurve(11e8, 3, 4.5)),
+    ("E'", SNCurve(3.9e8, 3, 2.6)),
+])
+
+# Width of the stress range histogram bins, in ksi
+BIN_WIDTH = 0.5
+
+# Counted cycles (half cycles count 0.5), the histogram as (low, high,
+# cycles) bins, the largest and the effective (root-mean-cube, for
+# exponent 3) stress range, and the Miner's rule damage sum for the curve.
+# Every cycle counts towards the damage, however small, which is
+# conservative; a max_range under curve.threshold means infinite life.
+FatigueResult = collections.namedtuple('FatigueResult', ['passages',
+                                                         'cycles',
+                                                         'histogram',
+                                                         'max_range',
+                                                         'effective_range',
+                                                         'damage'])
+
+
+def get_curve(curve):
+    # An SNCurve, or the one for a detail category name
+    if isinstance(curve, SNCurve):
+        return curve
+    try:
+        return DETAIL_CATEGORIES[curve]
+    except KeyError:
+        raise ValueError('Unknown detail category: ' + str(curve))
+
+
+def reversals(values):
+    # The peaks and valleys of a history, with its first and last values.
+    # Flat stretches count once.
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return values
+    steps = np.flatnonzero(np.diff(values))
+    if len(steps) == 0:
+        return values[:1]
+    signs = np.sign(values[steps + 1] - values[steps])
+    turns = steps[1:][signs[1:] != signs[:-1]]
+    return np.concatenate([values[:1], values[turns], values[-1:]])
+
+
+class RainflowCounter:
+    # Rainflow counting (ASTM E1049 four-point rule) done online: add
+    # reversals as they come and the closed cycles are counted straight
+    # away, leaving only the open ones on the stack. finish() counts what
+    # is left as half cycles. exponent is the S-N curve's, for the damage
+    # sums.
+
+    def __init__(self, bin_width=BIN_WIDTH, exponent=3):
+        if bin_width <= 0:
+            raise ValueError('Bin width must be positive')
+        self.bin_width = bin_width
+        self.exponent = exponent
+        self.stack = []
+        self.bins = collections.Counter()
+        self.cycles = 0.0
+        self.max_range = 0.0
+        self.power_sum = 0.0
+
+    def count(self, low, high, cycles):
+        stress_range = abs(high - low)
+        self.bins[int(stress_range // self.bin_width)] += cycles
+        self.cycles += cycles
+        self.max_range = max(self.max_range, stress_range)
+        self.power_sum += cycles*stress_range**self.exponent
+
+    def add(self, value):
+        # One reversal. A value carrying on in the same direction as the
+        # last just moves the last reversal on.
+        stack = self.stack
+        if stack and value == stack[-1]:
+            return
+        if len(stack) >= 2 and (value - stack[-1])*(stack[-1]
+                                                    - stack[-2]) > 0:
+            stack[-1] = value
+        else:
+            stack.append(value)
+        while len(stack) >= 3:
+            latest = abs(stack[-1] - stack[-2])
+            previous = abs(stack[-2] - stack[-3])
+            if latest < previous:
+                break
+            if len(stack) == 3:
+                # The range includes the start of the history
+                self.count(stack[0], stack[1], 0.5)
+                del stack[0]
+            else:
+                self.count(stack[-3], stack[-2], 1)
+                del stack[-3:-1]
+
+    def extend(self, values):
+        for value in values:
+            self.add(float(value))
+
+    def finish(self):
+        # Count the open ranges as half cycles and start again
+        for low, high in zip(self.stack, self.stack[1:]):
+            self.count(low, high, 0.5)
+        self.stack = []
+
+    def histogram(self):
+        return [(i*self.bin_width, (i + 1)*self.bin_width, self.bins[i])
+                for i in sorted(self.bins)]
+
+    @property
+    def effective_range(self):
+        if not self.cycles:
+            return 0.0
+        return (self.power_sum/self.cycles)**(1/self.exponent)
+
+    def damage(self, curve):
+        # Miner's rule sum for an S-N curve with the counter's exponent
+        return self.power_sum/get_curve(curve).coefficient
+
+
+def passage_reversals(span_length, x_loc, train=None, increment=1,
+                      effect='moment', factor=1, engine_name=None):
+    # Stress reversals at the section for one passage of the train
+    if effect not in ('moment', 'shear'):
+        raise ValueError('Effect must be moment or shear')
+    positions, m_array, v_array = engine.history(
+        span_length, x_loc, increment, engine=engine_name, train=train)
+    values = m_array if effect == 'moment' else v_array
+    return reversals(values)*factor
+
+
+def count_passages(span_length, x_loc, passages, increment=1,
+                   effect='moment', impact_factor=0, dist_factor=1,
+                   stress_factor=1, curve='E', x_is_fraction=False,
+                   bin_width=BIN_WIDTH, engine_name=None, progress=None,
+                   total=None):
+    # Rainflow count of the stress at the section for a sequence of train
+    # passages (trains.Train objects or names, in order; can be a
+    # generator). The passages follow on from each other with nothing in
+    # between, so a cycle can span several of them. progress is called
+    # with the fraction done after each passage; for a generator that
+    # needs total, the number of passages.
+    engine.check_inputs(span_length, increment)
+    x_loc = engine.resolve_x_loc(span_length, x_loc, x_is_fraction)
+    curve = get_curve(curve)
+    factor = (1 + impact_factor)*dist_factor*stress_factor
+    counter = RainflowCounter(bin_width, curve.exponent)
+    peaks = {}
+    count = 0
+    if total is None and hasattr(passages, '__len__'):
+        total = len(passages)
+    for train in passages:
+        train = trains.get_train(train)
+        key = tuple(train.key)
+        if key not in peaks:
+            peaks[key] = passage_reversals(span_length, x_loc, train,
+                                           increment, effect, factor,
+                                           engine_name)
+        counter.extend(peaks[key])
+        count += 1
+        if progress is not None and total:
+            progress(min(count/total, 1))
+    counter.finish()
+    return FatigueResult(count, counter.cycles, counter.histogram(),
+                         counter.max_range, counter.effective_range,
+                         counter.damage(curve))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Rainflow fatigue count for a sequence of trains.')
+    parser.add_argument('span_length', type=float, help='span in feet')
+    parser.add_argument('x_loc', type=float, help='section in feet')
+    parser.add_argument('--trains', nargs='+', choices=trains.train_names(),
+                        default=[trains.DEFAULT_TRAIN],
+                        help='trains in one repeat of the sequence')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='times the sequence runs')
+    parser.add_argument('--effect', choices=('moment', 'shear'),
+                        default='moment')
+    parser.add_argument('--increment', type=float, default=1,
+                        help='increment in inches')
+    parser.add_argument('--impact', type=float, default=0,
+                        help='impact factor')
+    parser.add_argument('--dist', type=float, default=1,
+                        help='distribution factor')
+    parser.add_argument('--stress-factor', type=float, default=1,
+                        help='stress per unit load effect')
+    parser.add_argument('--category', choices=list(DETAIL_CATEGORIES),
+                        default='E', help='detail category')
+    parser.add_argument('--bin-width', type=float, default=BIN_WIDTH)
+    args = parser.parse_args(argv)
+
+    passages = (train for _ in range(args.repeat) for train in args.trains)
+    try:
+        result = count_passages(args.span_length, args.x_loc, passages,
+                                args.increment, args.effect, args.impact,
+                                args.dist, args.stress_factor,
+                                args.category, bin_width=args.bin_width)
+    except ValueError as error:
+        parser.error(str(error))
+
+    for low, high, cycles in result.histogram:
+        print('%10.2f - %-10.2f %14g' % (low, high, cycles))
+    curve = get_curve(args.category)
+    print('%d passages, %g cycles, max range %.2f, effective range %.2f, '
+          'damage %.4g' % (result.passages, result.cycles, result.max_range,
+                           result.effective_range, result.damage))
+    if result.max_range < curve.threshold:
+        print('Max range is under the %.1f threshold for category %s'
+              % (curve.threshold, args.category))
+    elif result.damage > 0:
+        print('Passages to failure: %.4g'
+              % (result.passages/result.damage))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# Influence-line engine.
+#
+# Each section's influence line is sampled once on the train position grid
+# and the load effect for every train position is found as a convolution
+# of the axle loads with that line, done with FFTs when the grid is large.
+# Uniform loads are added in closed form from the area under the line.
+# Requires numpy.
+
+import numpy as np
+
+
+# Above this many multiply-adds per section the convolution is done with
+# FFTs instead of directly.
+FFT_THRESHOLD = 1 << 16
+
+# Upper limits on the number of samples and sections transformed together
+CHUNK_SIZE = 1 << 22
+SECTION_BLOCK = 16
+
+
+def moment_line(span_length, x_loc, u):
+    # Moment at x_loc for a unit load u feet from the first support
+    on_span = (0 < u) & (u < span_length)
+    line = np.where(u > x_loc,
+                    x_loc*(span_length - u),
+                    u*(span_length - x_loc))/span_length
+    return np.where(on_span, line, 0)
+
+
+def shear_line(span_length, x_loc, u):
+    # Shear at x_loc for a unit load u feet from the first support. A load
+    # right at the section counts as being to the right of it, and one
+    # right at a support as being on the span.
+    on_span = (0 <= u) & (u <= span_length)
+    line = np.where(u < x_loc, -u, span_length - u)/span_length
+    return np.where(on_span, line, 0)
+
+
+def section_line(span_length, x_loc, u):
+    # 1 for a unit load right at the section, where the shear jumps by it
+    return np.where(u == x_loc, 1.0, 0.0)
+
+
+def moment_area(span_length, x_loc, u):
+    # Area under moment_line from the first support to u
+    u = np.clip(u, 0, span_length)
+    left = np.minimum(u, x_loc)
+    right = span_length - u
+    return ((span_length - x_loc)*left*left
+            + x_loc*np.where(u > x_loc,
+                             (span_length - x_loc)**2 - right*right, 0)
+            )/(2*span_length)
+
+
+def shear_area(span_length, x_loc, u):
+    # Area under shear_line from the first support to u
+    u = np.clip(u, 0, span_length)
+    left = np.minimum(u, x_loc)
+    right = span_length - u
+    return (np.where(u > x_loc, (span_length - x_loc)**2 - right*right, 0)
+            - left*left)/(2*span_length)
+
+
+def no_area(span_length, x_loc, u):
+    # Area under section_line, which is only ever 1 at a point
+    return np.zeros(np.broadcast(x_loc, u).shape)
+
+
+# Each influence line with the area under it
+MOMENT = (moment_line, moment_area)
+SHEAR = (shear_line, shear_area)
+SECTION = (section_line, no_area)
+
+# The lines the engine uses: the load right at the section lets it take
+# the shear on whichever side of a jump is larger
+SECTION_LINES = (MOMENT, SHEAR, SECTION)
+
+
+def grid_loads(loads, offsets, incr):
+    # Split the axles by where their offset falls between grid points.
+    # Returns (remainder, weights) pairs, where weights[k] is the total
+    # load of the axles in that group k grid points behind the front.
+    loads = np.asarray(loads, dtype=float)
+    offsets = np.asarray(offsets, dtype=float)
+    steps = np.floor(offsets/incr + 1e-9)
+    remainders = np.round(offsets - steps*incr, 9)
+    steps = steps.astype(int)
+
+    groups = []
+    for remainder in np.unique(remainders):
+        in_group = remainders == remainder
+        weights = np.zeros(steps[in_group].max() + 1)
+        np.add.at(weights, steps[in_group], loads[in_group])
+        groups.append((float(remainder), weights))
+    return groups
+
+
+def convolve(weights, lines, count):
+    # Convolve one weight vector with each row of lines and keep the first
+    # count terms
+    size = len(weights) + lines.shape[1] - 1
+    if len(weights)*lines.shape[1] <= FFT_THRESHOLD:
+        full = np.array([np.convolve(weights, line) for line in lines])
+    else:
+        n = 1 << (size - 1).bit_length()
+        full = np.fft.irfft(np.fft.rfft(weights, n)*np.fft.rfft(lines, n),
+                            n)[:, :size]
+    if size < count:
+        full = np.pad(full, ((0, 0), (0, count - size)))
+    return full[:, :count]
+
+
+def load_effects(span_length, x_locs, consist, increment,
+                 lines=(MOMENT, SHEAR), progress=None):
+    # Load effect at each section in x_locs for every train position, for
+    # each (influence line, area) pair in lines. Returns the positions and
+    # one sections x positions array per line. progress is called with the
+    # fraction done after each block of sections.
+    incr = increment/12
+    count = int((consist.length + span_length)/incr + 1e-9) + 1
+    positions = -span_length + np.arange(count)*incr
+    x_locs = np.asarray(x_locs, dtype=float)
+
+    groups = grid_loads(consist.arrays.loads, consist.arrays.offsets, incr)
+    effects = [np.zeros((len(x_locs), count)) for _ in lines]
+
+    # Grid points covering the span. The axle at grid step i - k sits at
+    # u = (i - k)*incr - remainder from the first support.
+    samples = np.arange(int(span_length/incr) + 2)
+    rows = max(1, min(SECTION_BLOCK, CHUNK_SIZE // (len(samples) + count)))
+    blocks = (len(groups) + 1)*-(-len(x_locs) // rows)
+    done = 0
+
+    for remainder, weights in groups:
+        u = samples*incr - remainder
+        for start in range(0, len(x_locs), rows):
+            if progress is not None:
+                progress(done/blocks)
+            done += 1
+            stop = start + rows
+            x = x_locs[start:stop, None]
+            for (line, _), effect in zip(lines, effects):
+                effect[start:stop] += convolve(
+                    weights, line(span_length, x, u), count)
+
+    # A uniform load from offset start to end covers the span from
+    # u = span + position - end to u = span + position - start
+    for start in range(0, len(x_locs), rows):
+        if progress is not None:
+            progress(done/blocks)
+        done += 1
+        stop = start + rows
+        x = x_locs[start:stop, None]
+        for begin, end, load in consist.segments:
+            front = span_length + positions - begin
+            rear = span_length + positions - end
+            for (_, area), effect in zip(lines, effects):
+                effect[start:stop] += load*(area(span_length, x, front)
+                                            - area(span_length, x, rear))
+
+    return positions, effects
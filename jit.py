@@ -0,0 +1,86 @@
+# Numba-compiled sweep.
+#
+# The running-sum sweep of engine.effects_window as one compiled loop over
+# the train positions. Nothing is allocated apart from the output arrays.
+# When only the maximums are wanted (engine.calculate) even those are
+# skipped, because the maximums are picked out in the same loop. Compiled
+# code is cached on disk, so only the first run on a machine pays for the
+# compilation. Requires numba; engine.py only offers the 'jit' engine when
+# it is installed.
+
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True, nogil=True)
+def sweep_kernel(span_length, x_loc, offsets, sums, moments, segments,
+                 incr, first, stop, m_out, v_out):
+    # Moment and shear at x_loc for positions first to stop - 1 of the grid
+    # -span_length + i*incr, stored in m_out and v_out unless they are
+    # empty. segments is an array of (start, end, load) rows. Returns the
+    # first maximum moment and absolute shear with their position indexes.
+    num_axles = len(offsets)
+    store = len(m_out) > 0
+    lo = 0
+    hi = 0
+    right = 0
+    left = 0
+    m_best = -np.inf
+    m_index = first
+    v_best = -1.0
+    v_index = first
+
+    for i in range(first, stop):
+        position = -span_length + i*incr
+        front = span_length + position
+        cut = front - x_loc
+        while lo < num_axles and offsets[lo] < position:
+            lo += 1
+        while hi < num_axles and offsets[hi] <= front:
+            hi += 1
+        while right < num_axles and offsets[right] < cut:
+            right += 1
+        while left < num_axles and offsets[left] <= cut:
+            left += 1
+        r = max(right, lo)
+        l = min(left, hi)
+
+        on_load = sums[hi] - sums[lo]
+        r2 = (on_load*front - moments[hi] + moments[lo])/span_length
+        m_val = (r2*(span_length - x_loc) - (sums[r] - sums[lo])*cut
+                 + moments[r] - moments[lo])
+        v_val = on_load - r2 - sums[hi] + sums[l]
+        v_at = sums[l] - sums[r] if l > r else 0.0
+
+        for k in range(segments.shape[0]):
+            load = segments[k, 2]
+            seg_lo = min(max(front - segments[k, 1], 0.0), span_length)
+            seg_hi = min(max(front - segments[k, 0], 0.0), span_length)
+            seg_r2 = load*(seg_hi*seg_hi - seg_lo*seg_lo)/(2*span_length)
+            right_lo = max(seg_lo, x_loc) - x_loc
+            right_hi = max(seg_hi, x_loc) - x_loc
+            m_val += (seg_r2*(span_length - x_loc)
+                      - load*(right_hi*right_hi - right_lo*right_lo)/2)
+            v_val += (load*(seg_hi - seg_lo) - seg_r2
+                      - load*(min(seg_hi, x_loc) - min(seg_lo, x_loc)))
+        # As engine.one_sided_shear
+        if 2*v_val < v_at:
+            v_val -= v_at
+
+        if store:
+            m_out[i - first] = m_val
+            v_out[i - first] = v_val
+        if m_val > m_best:
+            m_best = m_val
+            m_index = i
+        if abs(v_val) > v_best:
+            v_best = abs(v_val)
+            v_index = i
+
+    return m_best, m_index, v_best, v_index
+
+
+def kernel_args(consist):
+    # The consist as the arrays sweep_kernel takes
+    arrays = consist.arrays
+    return arrays.offsets, arrays.sums, arrays.moments, arrays.segments
@@ -0,0 +1,187 @@
+# Multiple tracks.
+#
+# A member carrying load from two or more tracks, with a train on each.
+# Each track's moment and shear history at the section is swept once, and
+# then scaled by that track's distribution factor. Histories are cached by
+# train, so tracks with the same train share one. Every track is placed
+# relative to the train on the first track. With an allowed range of
+# offsets for a track, the best placement within the range, for each
+# position of the first train, is a sliding-window maximum of that track's
+# history. The tracks' windows don't depend on each other, so the
+# combination is a sum of shifted arrays and needs no sweep per offset.
+# Multiple presence factors (AREMA by default) go to whichever loaded
+# tracks give the greatest effect, so every assignment of them is tried,
+# and so is every set of loaded tracks, so leaving a track empty is
+# considered too.
+# Requires numpy.
+
+import collections
+import functools
+import itertools
+import math
+
+import numpy as np
+
+import engine
+import trains
+
+
+# A train on a track, with the track's distribution factor and the range
+# of offsets (feet, low, high) of the front of its train ahead of the
+# front of the first track's train. offsets None means any offset. The
+# first track's offsets are ignored.
+Track = collections.namedtuple('Track', ['train', 'dist_factor', 'offsets'])
+Track.__new__.__defaults__ = (None, 1, None)
+
+# Load factors by number of loaded tracks: full load on two tracks, half
+# on a third and a quarter on a fourth (AREMA). Which track gets which is
+# chosen to give the greatest effect.
+PRESENCE_FACTORS = {1: (1,), 2: (1, 1), 3: (1, 1, 0.5),
+                    4: (1, 1, 0.5, 0.25)}
+
+# Position of the first track's train (front past the last support, feet)
+# and each track's offset from it, None for a track left empty
+Placement = collections.namedtuple('Placement', ['position', 'offsets'])
+
+# Factored combined maximum moment and maximum positive and negative shear
+# at the section, with the placements that cause them
+MultiResult = collections.namedtuple('MultiResult', ['max_moment',
+                                                     'moment_placement',
+                                                     'max_shear',
+                                                     'max_shear_placement',
+                                                     'min_shear',
+                                                     'min_shear_placement'])
+
+
+@functools.lru_cache(maxsize=16)
+def track_history(span_length, x_loc, increment, engine_name, train):
+    # Moment and shear at the section for each train position on the grid
+    # -span_length + i*increment/12
+    consist = train.consist(span_length)
+    positions, m_array, v_array = engine.get_engine(engine_name)(
+        span_length, x_loc, consist, increment)
+    return np.asarray(m_array, dtype=float), np.asarray(v_array, dtype=float)
+
+
+def sliding(values, width, reduce):
+    # reduce (np.maximum or np.minimum) over each run of width values, by
+    # doubling the run length
+    out = values
+    run = 1
+    while 2*run <= width:
+        out = reduce(out[:-run], out[run:])
+        run *= 2
+    if run < width:
+        out = reduce(out[:len(out) - (width - run)], out[width - run:])
+    return out
+
+
+def window_extremes(values, low, high, first, count, reduce):
+    # For i = first .. first + count - 1, the extreme of values[i + low]
+    # to values[i + high], with 0 off the ends (the train not on the span)
+    pad_left = max(0, -(first + low))
+    pad_right = max(0, first + count - 1 + high - (len(values) - 1))
+    padded = np.concatenate([np.zeros(pad_left), values,
+                             np.zeros(pad_right)])
+    start = first + low + pad_left
+    return sliding(padded[start:start + count + high - low],
+                   high - low + 1, reduce)
+
+
+def step_range(offsets, incr, size):
+    # An offset range in feet as grid steps. No range allows any offset
+    # that puts the train on the span.
+    if offsets is None:
+        return -size, size
+    low, high = offsets
+    if low > high:
+        raise ValueError('Offset range must be low, high')
+    return math.ceil(low/incr - 1e-9), math.floor(high/incr + 1e-9)
+
+
+def check_tracks(tracks):
+    if not tracks:
+        raise ValueError('At least one track is needed')
+    if any(track.dist_factor < 0 for track in tracks):
+        raise ValueError('Distribution factors must not be negative')
+
+
+def combine(histories, ranges, factors, reduce, arg):
+    # Best sum of the tracks' histories, each times its factor, over the
+    # positions of the first train and the offsets of the others. Returns
+    # the value, the first train's grid index and each track's offset in
+    # steps.
+    first = min(-high for low, high in ranges)
+    last = max(len(values) - 1 - low
+               for values, (low, high) in zip(histories, ranges))
+    count = last - first + 1
+    total = np.zeros(count)
+    for values, (low, high), factor in zip(histories, ranges, factors):
+        total += factor*window_extremes(values, low, high, first, count,
+                                        reduce)
+    index = int(arg(total))
+
+    steps = []
+    for values, (low, high) in zip(histories, ranges):
+        # Where in its window this track's extreme is
+        at = first + index + np.arange(low, high + 1)
+        inside = (0 <= at) & (at < len(values))
+        window = np.where(inside, values[np.clip(at, 0, len(values) - 1)],
+                          0)
+        steps.append(low + int(arg(window)))
+    return float(total[index]), first + index, steps
+
+
+def calculate(span_length, x_loc, tracks, increment=1, impact_factor=0,
+              presence=PRESENCE_FACTORS, x_is_fraction=False,
+              engine_name=None):
+    # Combined maximums at the section for trains on several tracks.
+    # tracks are Track tuples (or trains, for a factor of 1 and any
+    # offset). presence maps a number of loaded tracks to the factors for
+    # them, in any order. engine_name must be an engine that sweeps a
+    # uniform grid (not exact or adaptive).
+    engine.check_inputs(span_length, increment)
+    x_loc = engine.resolve_x_loc(span_length, x_loc, x_is_fraction)
+    tracks = [track if isinstance(track, Track) else Track(track)
+              for track in tracks]
+    check_tracks(tracks)
+    engine_name = engine.engine_name(engine_name)
+    if engine_name in ('exact', 'adaptive'):
+        raise ValueError('Multiple tracks need an engine that sweeps a '
+                         'uniform grid')
+    incr = increment/12
+
+    histories = [track_history(span_length, x_loc, increment, engine_name,
+                               trains.get_train(track.train))
+                 for track in tracks]
+    size = max(len(m_array) for m_array, _ in histories)
+    ranges = [(0, 0)] + [step_range(track.offsets, incr, size)
+                         for track in tracks[1:]]
+
+    best = {}
+    for count in range(1, len(tracks) + 1):
+        if count not in presence:
+            continue
+        orders = sorted(set(itertools.permutations(presence[count])))
+        for loaded in itertools.combinations(range(len(tracks)), count):
+            for order in orders:
+                factors = [(1 + impact_factor)*tracks[k].dist_factor*factor
+                           for k, factor in zip(loaded, order)]
+                for name, which, sign in (('moment', 0, 1),
+                                          ('max_shear', 1, 1),
+                                          ('min_shear', 1, -1)):
+                    reduce, arg = ((np.maximum, np.argmax) if sign > 0
+                                   else (np.minimum, np.argmin))
+                    value, index, steps = combine(
+                        [histories[k][which] for k in loaded],
+                        [ranges[k] for k in loaded], factors, reduce, arg)
+                    if name not in best or sign*value > sign*best[name][0]:
+                        offsets = [None]*len(tracks)
+                        for k, step in zip(loaded, steps):
+                            offsets[k] = step*incr
+                        best[name] = (value,
+                                      Placement(-span_length + index*incr,
+                                                offsets))
+
+    return MultiResult(*best['moment'], *best['max_shear'],
+                       *best['min_shear'])
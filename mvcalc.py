@@ -1,749 +1,718 @@
 #!/usr/local/bin/python3
 
-import tkinter
-from tkinter import ttk
-from tkinter import messagebox
-import operator
+import concurrent.futures
 import os
 import sys
-import matplotlib
-matplotlib.use("TkAgg")
-import matplotlib.pyplot as plt
+import threading
 
+import cache
+import engine
+import profiling
+import trains
 
-def calculate(*args):
-    # Get values from input
-    try:
-        span_length = float(span_length_entry.get())
-        x_loc = float(x_loc_entry.get())
-        feet_or_frac = feet_or_frac_entry.get()
-        x_loc = x_loc * span_length if feet_or_frac == 2 else x_loc
-        incr = float(increment_entry.get())/12
-        impact_factor = float(impact_factor_entry.get())
-        dist_factor = float(dist_factor_entry.get())
-    except ValueError:
-        messagebox.showerror('Error', 'Invalid Input!')
-        return
-
-    # Cooper E-80 Axle Layout
-    axle_loads = [40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  8]
-
-    axle_spaces = [0, 8, 5, 5, 5, 9, 5, 6, 5,
-                   8, 8, 5, 5, 5, 9, 5, 6, 5,
-                   5.5]
-
-    # Add trailing live load up to length of span
-    train_len = sum(axle_spaces)
-    while (sum(axle_spaces) - train_len) < span_length:
-        axle_spaces.append(1)
-        axle_loads.append(8)
-
-    num_axles = len(axle_loads)
-
-    train_tot = sum(axle_spaces)
-
-    # Initialize train positions array
-    positions = []
-    point = -span_length
-    while point <= train_tot:
-        positions.append(point)
-        point += incr
-
-    # Initialize arrays to hold total moment and shear values.
-    # These arrays will be used to store the moment and shear values per
-    # position of the train. We will run the "max" function to find max
-    # values in these arrays
-    m_array = []
-    v_array = []
-
-    for i in range(len(positions)):
-        # a and b arrays store a and b values or each axle
-        # r1 and r2 arrays store reactions at ends 1 and 2 for each axle
-        # m and v arrays store m and v caused by each axle
-        a = []
-        b = []
-        r1 = []
-        r2 = []
-        m = []
-        v = []
-
-        # This loop calculates individual values for each of the above
-        # arrays and appends each value to the array.
-        for j in range(num_axles):
-            a_val = span_length + positions[i] - sum(axle_spaces[:j+1])
-            a.append(a_val)
-
-            b_val = span_length - a_val
-            b.append(b_val)
-
-            if 0 < b_val < span_length and a_val > x_loc:
-                m_val = axle_loads[j]*(a_val - x_loc)
-            else:
-                m_val = 0
-            m.append(m_val)
-
-            if 0 < b_val < span_length and a_val < x_loc:
-                v_val = axle_loads[j]
-            else:
-                v_val = 0
-            v.append(v_val)
-
-            if 0 < b_val < span_length:
-                r1_val = axle_loads[j]*b_val/span_length
-            else:
-                r1_val = 0
-            r1.append(r1_val)
-
-            if 0 < a_val < span_length:
-                r2_val = axle_loads[j]*a_val/span_length
-            else:
-                r2_val = 0
-            r2.append(r2_val)
-
-        # Calculate the moment and shear at the respective x location
-        # caused by the train at position i and push these values to the
-        # global moment and shear arrays
-        m_tot = sum(r2)*(span_length-x_loc) - sum(m)
-        v_tot = abs(sum(r1) - sum(v))
-        m_array.append(m_tot)
-        v_array.append(v_tot)
-
-    # Find max and position of train to cause max
-    m_loc_index, m_max = max(enumerate(m_array), key=operator.itemgetter(1))
-    v_loc_index, v_max = max(enumerate(v_array), key=operator.itemgetter(1))
-    m_max = m_max*(1 + impact_factor)*dist_factor
-    v_max = v_max*(1 + impact_factor)*dist_factor
-    m_max_loc = positions[m_loc_index]
-    v_max_loc = positions[v_loc_index]
-
-    # Set values in GUI to calculated values
-    max_moment_disp.set(round(m_max, 2))
-    max_shear_disp.set(round(v_max, 2))
-    max_moment_loc_disp.set(round(m_max_loc, 2))
-    max_shear_loc_disp.set(round(v_max_loc, 2))
-
-
-def clear(*args):
-
-    # Set all "settable" labels in GUI to nothing
-    max_moment_disp.set('')
-    max_shear_disp.set('')
-    max_moment_loc_disp.set('')
-    max_shear_loc_disp.set('')
-
-
-def show_plot_moment(*args):
-
-    # Get input
-    try:
-        span_length = float(span_length_entry.get())
-        x_loc = float(x_loc_entry.get())
-        feet_or_frac = feet_or_frac_entry.get()
-        x_loc = x_loc * span_length if feet_or_frac == 2 else x_loc
-    except ValueError:
-        messagebox.showerror('Error', 'Invalid Input!')
-        return
 
-    try:
-        axle_pos = float(max_moment_loc_disp.get())
-    except ValueError:
-        messagebox.showerror('Error', 'Train position not calculated!')
-        return
-
-    # Plot span
-    span = plt.plot([0, span_length], [0, 0])
-    plt.setp(span, color='b')
-
-    # Add boundaries to span
-    # tri_width = (span_length*1.2+20)/120
-    # bound1 = plt.plot([0, -tri_width, tri_width, 0], [0, -2, -2, 0])
-    bound1 = plt.plot(0, -0.7)
-    plt.setp(bound1, color='b', marker='^')
-    bound2 = plt.plot(span_length, -0.7)
-    plt.setp(bound2, color='b', marker='o')
-
-    axle_pos += span_length
-
-    # Cooper E-80 Axle Layout
-    axle_loads = [40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  8]
-
-    axle_spaces = [0, 8, 5, 5, 5, 9, 5, 6, 5,
-                   8, 8, 5, 5, 5, 9, 5, 6, 5,
-                   5.5]
-
-    train_len = sum(axle_spaces)
-    while (sum(axle_spaces) - train_len) < span_length:
-        axle_spaces.append(1)
-        axle_loads.append(8)
-
-    for pos, spac in enumerate(axle_spaces):
-        axle_pos = axle_pos - spac
-        axle_load = 1 + axle_loads[pos] / 4
-        axle = plt.plot([axle_pos, axle_pos], [1, axle_load])
-        plt.setp(axle, color='r')
-        axle_end = plt.plot(axle_pos, 1)
-        plt.setp(axle_end, color='r', marker='v')
-    xplot = plt.plot([x_loc, x_loc], [-1, -5])
-    xplotarr = plt.plot(x_loc, -1)
-    plt.setp(xplot, color='y')
-    plt.setp(xplotarr, color='y', marker='^')
-    plt.axis([-20, span_length + 20, -30, 60])
-    cur_axes = plt.gca()
-    cur_axes.axes.get_xaxis().set_visible(False)
-    cur_axes.axes.get_yaxis().set_visible(False)
-    plt.title('Train Position for Max Moment')
-    plt.show()
-
-
-def show_plot_shear(*args):
-    try:
-        span_length = float(span_length_entry.get())
-        x_loc = float(x_loc_entry.get())
-        feet_or_frac = feet_or_frac_entry.get()
-        x_loc = x_loc * span_length if feet_or_frac == 2 else x_loc
-    except ValueError:
-        messagebox.showerror('Error', 'Invalid Input!')
-        return
+# Calculation methods offered in the window and the engine for each
+METHODS = {'Sweep': None, 'Adaptive': 'adaptive', 'Exact': 'exact'}
 
+# How often the window checks on a background calculation, in milliseconds
+POLL_INTERVAL = 50
+
+
+def open_table():
+    # The precomputed envelope table, if numpy is installed and one has
+    # been built
     try:
-        axle_pos = float(max_shear_loc_disp.get())
-    except ValueError:
-        messagebox.showerror('Error', 'Train position not calculated!')
-        return
-
-    # Plot span
-    span = plt.plot([0, span_length], [0, 0])
-    plt.setp(span, color='b')
-
-    # Add boundaries to span
-    # tri_width = (span_length*1.2+20)/120
-    # bound1 = plt.plot([0, -tri_width, tri_width, 0], [0, -2, -2, 0])
-    bound1 = plt.plot(0, -0.7)
-    plt.setp(bound1, color='b', marker='^')
-    bound2 = plt.plot(span_length, -0.7)
-    plt.setp(bound2, color='b', marker='o')
-
-    axle_pos += span_length
-
-    # Cooper E-80 Axle Layout
-    axle_loads = [40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  8]
-
-    axle_spaces = [0, 8, 5, 5, 5, 9, 5, 6, 5,
-                   8, 8, 5, 5, 5, 9, 5, 6, 5,
-                   5.5]
-
-    train_len = sum(axle_spaces)
-    while (sum(axle_spaces) - train_len) < span_length:
-        axle_spaces.append(1)
-        axle_loads.append(8)
-
-    for pos, spac in enumerate(axle_spaces):
-        axle_pos = axle_pos - spac
-        axle_load = 1 + axle_loads[pos] / 4
-        axle = plt.plot([axle_pos, axle_pos], [1, axle_load])
-        plt.setp(axle, color='r')
-        axle_end = plt.plot(axle_pos, 1)
-        plt.setp(axle_end, color='r', marker='v')
-    xplot = plt.plot([x_loc, x_loc], [-1, -5])
-    xplotarr = plt.plot(x_loc, -1)
-    plt.setp(xplot, color='y')
-    plt.setp(xplotarr, color='y', marker='^')
-    plt.axis([-20, span_length + 20, -30, 60])
-    cur_axes = plt.gca()
-    cur_axes.axes.get_xaxis().set_visible(False)
-    cur_axes.axes.get_yaxis().set_visible(False)
-    plt.title('Train Position for Max Shear')
-    plt.show()
-
-
-def nth_point_moment(*args):
-    # Get values from input
-    try:
-        span_length = float(span_length_entry.get())
-        n = int(nth_points_entry.get())
-        incr = float(increment_entry.get())/12
-        impact_factor = float(impact_factor_entry.get())
-        dist_factor = float(dist_factor_entry.get())
-    except ValueError:
-        messagebox.showerror('Error', 'Invalid Input!')
-        return
-
-    x_locs = [i*span_length/n for i in range(n+1)]
-
-    # Cooper E-80 Axle Layout
-    axle_loads = [40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  8]
-
-    axle_spaces = [0, 8, 5, 5, 5, 9, 5, 6, 5,
-                   8, 8, 5, 5, 5, 9, 5, 6, 5,
-                   5.5]
-    train_len = sum(axle_spaces)
-    while (sum(axle_spaces) - train_len) < span_length:
-        axle_spaces.append(1)
-        axle_loads.append(8)
-
-    num_axles = len(axle_loads)
-
-    train_tot = sum(axle_spaces)
-    # Initialize train positions array
-    positions = []
-    point = -span_length
-    while point <= train_tot:
-        positions.append(point)
-        point += incr
-
-    # Initialize arrays to hold total moment and shear values.
-    # These arrays will be used to store the moment and shear values per
-    # position of the train. We will run the "max" function to find max
-    # values in these arrays
-    m_maxs = []
-
-    for loc in x_locs:
-        m_array = []
-
-        for i in range(len(positions)):
-            # a and b arrays store a and b values or each axle
-            # r1 and r2 arrays store reactions at ends 1 and 2 for each axle
-            # m and v arrays store m and v caused by each axle
-            a = []
-            b = []
-            r2 = []
-            m = []
-
-            # This loop calculates individual values for each of the above
-            # arrays and appends each value to the array.
-            for j in range(num_axles):
-                a_val = span_length + positions[i] - sum(axle_spaces[:j+1])
-                a.append(a_val)
-
-                b_val = span_length - a_val
-                b.append(b_val)
-
-                if 0 < b_val < span_length and a_val > loc:
-                    m_val = axle_loads[j]*(a_val - loc)
-                else:
-                    m_val = 0
-                m.append(m_val)
-
-                if 0 < a_val < span_length:
-                    r2_val = axle_loads[j]*a_val/span_length
-                else:
-                    r2_val = 0
-                r2.append(r2_val)
-
-            # Calculate the moment and shear at the respective x location
-            # caused by the train at position i and push these values to the
-            # global moment and shear arrays
-            m_tot = sum(r2)*(span_length-loc) - sum(m)
-            m_array.append(m_tot)
-
-        # Find max and position of train to cause max
-        m_max = max(m_array)
-        m_max = m_max*(1 + impact_factor)*dist_factor
-        m_maxs.append(m_max)
-
-    plt.plot(x_locs, m_maxs)
-    plt.ylabel('Maximum Moment, kip-ft')
-    plt.xlabel('Span Position, ft')
-    plt.title('Maximum Moment at '+str(n)+'th Points Along Span')
-    plt.show()
-
-
-def nth_point_shear(*args):
-    # Get values from input
-    try:
-        span_length = float(span_length_entry.get())
-        n = int(nth_points_entry.get())
-        incr = float(increment_entry.get())/12
-        impact_factor = float(impact_factor_entry.get())
-        dist_factor = float(dist_factor_entry.get())
-    except ValueError:
-        messagebox.showerror('Error', 'Invalid Input!')
-        return
-
-    x_locs = [i*span_length/n for i in range(n+1)]
-
-    # Cooper E-80 Axle Layout
-    axle_loads = [40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  40, 80, 80, 80, 80, 52, 52, 52, 52,
-                  8]
-
-    axle_spaces = [0, 8, 5, 5, 5, 9, 5, 6, 5,
-                   8, 8, 5, 5, 5, 9, 5, 6, 5,
-                   5.5]
-    train_len = sum(axle_spaces)
-    while (sum(axle_spaces) - train_len) < span_length:
-        axle_spaces.append(1)
-        axle_loads.append(8)
-
-    num_axles = len(axle_loads)
-
-    train_tot = sum(axle_spaces)
-    # Initialize train positions array
-    positions = []
-    point = -span_length
-    while point <= train_tot:
-        positions.append(point)
-        point += incr
-
-    # Initialize arrays to hold total moment and shear values.
-    # These arrays will be used to store the moment and shear values per
-    # position of the train. We will run the "max" function to find max
-    # values in these arrays
-    v_maxs=[]
-
-    for loc in x_locs:
-        v_array = []
-
-        for i in range(len(positions)):
-            # a and b arrays store a and b values or each axle
-            # r1 and r2 arrays store reactions at ends 1 and 2 for each axle
-            # m and v arrays store m and v caused by each axle
-            a = []
-            b = []
-            r1 = []
-            v = []
-
-            # This loop calculates individual values for each of the above
-            # arrays and appends each value to the array.
-            for j in range(num_axles):
-                a_val = span_length + positions[i] - sum(axle_spaces[:j+1])
-                a.append(a_val)
-
-                b_val = span_length - a_val
-                b.append(b_val)
-
-                if 0 < b_val < span_length and a_val < loc:
-                    v_val = axle_loads[j]
-                else:
-                    v_val = 0
-                v.append(v_val)
-
-                if 0 < b_val < span_length:
-                    r1_val = axle_loads[j]*b_val/span_length
-                else:
-                    r1_val = 0
-                r1.append(r1_val)
-
-            # Calculate the moment and shear at the respective x location
-            # caused by the train at position i and push these values to the
-            # global moment and shear arrays
-            v_tot = abs(sum(r1) - sum(v))
-            v_array.append(v_tot)
-
-        # Find max and position of train to cause max
-        v_max = max(v_array)
-        v_max = v_max*(1 + impact_factor)*dist_factor
-        v_maxs.append(v_max)
-
-    plt.plot(x_locs, v_maxs)
-    plt.ylabel('Maximum Shear, kips')
-    plt.xlabel('Span Position, ft')
-    plt.title('Maximum Shear at '+str(n)+'th Points Along Span')
-    plt.show()
-
-# Shorten notation for sticky values
-N = tkinter.N
-S = tkinter.S
-E = tkinter.E
-W = tkinter.W
-
-# Initialize root window, title, and give it weight
-root = tkinter.Tk()
-root.title('Cooper E-80 Max Shear/Moment Calculator')
-root.columnconfigure(0, weight=1)
-root.rowconfigure(0, weight=1)
-
-# Initialize main frame inside root window
-mainframe = ttk.Frame(root, padding="5 5 12 12")
-mainframe.grid(column=0,
-               row=0,
-               sticky=N+S+E+W)
-
-for i in range(1, 4):
-    for j in range(1, 3):
-        mainframe.columnconfigure(j, weight=1)
-        mainframe.rowconfigure(i, weight=1)
-
-# Create frame for inputs
-inputframe = ttk.Frame(mainframe,
-                       padding="8 8 8 8",
-                       borderwidth=2,
-                       relief=tkinter.RIDGE)
-inputframe.grid(column=1, row=1, sticky=N + S + E + W)
-
-for i in range(1, 8):
-    for j in range(1, 4):
-        inputframe.columnconfigure(j, weight=1)
-        inputframe.rowconfigure(i, weight=1)
-
-# Create frame for n-th point analysis
-nframe = ttk.Frame(mainframe,
-                   padding='8 8 10 10',
-                   borderwidth=2,
-                   relief=tkinter.RIDGE)
-nframe.grid(column=2, row=1, sticky=N+S+E+W)
-
-for i in range(1, 3):
-    for j in range(1, 3):
-        nframe.columnconfigure(j, weight=1)
-        nframe.rowconfigure(i, weight=1)
-
-# Create frame for results
-resultframe = ttk.Frame(mainframe,
-                        padding='8 8 8 8',
-                        borderwidth=2,
-                        relief=tkinter.RIDGE)
-resultframe.grid(column=1, row=2, columnspan=2, sticky=N+S+E+W)
-
-for i in range(1, 3):
-    for j in range(1, 8):
-        resultframe.columnconfigure(j, weight=1)
-        resultframe.rowconfigure(i, weight=1)
-
-# Create frame for buttons
-buttonframe = ttk.Frame(mainframe, padding='8 8 8 8')
-buttonframe.grid(column=1, row=3, columnspan=2, sticky=N+S+E+W)
-
-for i in range(1, 2):
-    for j in range(1, 5):
-        buttonframe.columnconfigure(j, weight=1)
-        buttonframe.rowconfigure(i, weight=1)
-
-# Initialize changeable variables
-span_length_entry = tkinter.StringVar()
-x_loc_entry = tkinter.StringVar()
-feet_or_frac_entry = tkinter.IntVar()
-increment_entry = tkinter.StringVar()
-impact_factor_entry = tkinter.StringVar()
-dist_factor_entry = tkinter.StringVar()
-max_moment_disp = tkinter.StringVar()
-max_moment_loc_disp = tkinter.StringVar()
-max_shear_disp = tkinter.StringVar()
-max_shear_loc_disp = tkinter.StringVar()
-
-# Create labels for each input box and assign them to grid spaces
-ttk.Label(inputframe, text='Inputs',
-          font='-weight bold',
-          padding='0 0 0 5').grid(row=1,
-                                    column=1,
-                                    columnspan=3,
-                                    sticky=N+S)
-ttk.Label(inputframe,
-          text='Span Length:').grid(column=1,
-                                    row=2,
-                                    sticky=W+E)
-ttk.Label(inputframe,
-          text='x-Location:').grid(column=1,
-                                   row=3,
-                                   rowspan=2,
-                                   sticky=W+E)
-ttk.Label(inputframe,
-          text='Increment:').grid(column=1,
-                                  row=5,
-                                  sticky=W+E)
-ttk.Label(inputframe,
-          text='Impact Factor:').grid(column=1,
-                                      row=6,
-                                      sticky=W+E)
-ttk.Label(inputframe,
-          text='Distribution Factor:').grid(column=1,
-                                            row=7,
+        import tables
+    except ImportError:
+        return None
+    return tables.open_table()
+
+
+class Calculator:
+    # The Tk window. tkinter (and matplotlib, for the plots) is imported
+    # here rather than at module level so that importing mvcalc never needs
+    # a display.
+
+    def __init__(self, root):
+        import tkinter
+        from tkinter import ttk
+        from tkinter import messagebox
+
+        self.root = root
+        self.messagebox = messagebox
+        self.cache = cache.open_cache()
+        self.table = open_table()
+
+        # Shorten notation for sticky values
+        N = tkinter.N
+        S = tkinter.S
+        E = tkinter.E
+        W = tkinter.W
+
+        # Give root window a title and weight
+        root.title('Cooper E-80 Max Shear/Moment Calculator')
+        root.columnconfigure(0, weight=1)
+        root.rowconfigure(0, weight=1)
+
+        # Initialize main frame inside root window
+        mainframe = ttk.Frame(root, padding="5 5 12 12")
+        mainframe.grid(column=0,
+                       row=0,
+                       sticky=N+S+E+W)
+
+        for i in range(1, 5):
+            for j in range(1, 3):
+                mainframe.columnconfigure(j, weight=1)
+                mainframe.rowconfigure(i, weight=1)
+
+        # Create frame for inputs
+        inputframe = ttk.Frame(mainframe,
+                               padding="8 8 8 8",
+                               borderwidth=2,
+                               relief=tkinter.RIDGE)
+        inputframe.grid(column=1, row=1, sticky=N + S + E + W)
+
+        for i in range(1, 10):
+            for j in range(1, 4):
+                inputframe.columnconfigure(j, weight=1)
+                inputframe.rowconfigure(i, weight=1)
+
+        # Create frame for n-th point analysis
+        nframe = ttk.Frame(mainframe,
+                           padding='8 8 10 10',
+                           borderwidth=2,
+                           relief=tkinter.RIDGE)
+        nframe.grid(column=2, row=1, sticky=N+S+E+W)
+
+        for i in range(1, 3):
+            for j in range(1, 3):
+                nframe.columnconfigure(j, weight=1)
+                nframe.rowconfigure(i, weight=1)
+
+        # Create frame for results
+        resultframe = ttk.Frame(mainframe,
+                                padding='8 8 8 8',
+                                borderwidth=2,
+                                relief=tkinter.RIDGE)
+        resultframe.grid(column=1, row=2, columnspan=2, sticky=N+S+E+W)
+
+        for i in range(1, 3):
+            for j in range(1, 8):
+                resultframe.columnconfigure(j, weight=1)
+                resultframe.rowconfigure(i, weight=1)
+
+        # Create frame for buttons
+        buttonframe = ttk.Frame(mainframe, padding='8 8 8 8')
+        buttonframe.grid(column=1, row=3, columnspan=2, sticky=N+S+E+W)
+
+        for i in range(1, 2):
+            for j in range(1, 6):
+                buttonframe.columnconfigure(j, weight=1)
+                buttonframe.rowconfigure(i, weight=1)
+
+        # Initialize changeable variables
+        self.span_length_entry = tkinter.StringVar()
+        self.x_loc_entry = tkinter.StringVar()
+        self.feet_or_frac_entry = tkinter.IntVar()
+        self.increment_entry = tkinter.StringVar()
+        self.impact_factor_entry = tkinter.StringVar()
+        self.dist_factor_entry = tkinter.StringVar()
+        self.max_moment_disp = tkinter.StringVar()
+        self.max_moment_loc_disp = tkinter.StringVar()
+        self.max_shear_disp = tkinter.StringVar()
+        self.max_shear_loc_disp = tkinter.StringVar()
+        self.nth_points_entry = tkinter.StringVar()
+        self.method_entry = tkinter.StringVar()
+        self.train_entry = tkinter.StringVar()
+
+        # Create labels for each input box and assign them to grid spaces
+        ttk.Label(inputframe, text='Inputs',
+                  font='-weight bold',
+                  padding='0 0 0 5').grid(row=1,
+                                            column=1,
+                                            columnspan=3,
+                                            sticky=N+S)
+        ttk.Label(inputframe,
+                  text='Span Length:').grid(column=1,
+                                            row=2,
                                             sticky=W+E)
-
-# Create entry boxes and assign them to grid spaces
-span_length_entry_box = ttk.Entry(inputframe,
-                                  width=7,
-                                  textvariable=span_length_entry)
-span_length_entry_box.grid(column=2,
-                           row=2,
-                           sticky=W+E)
-x_loc_entry_box = ttk.Entry(inputframe,
-                            width=7,
-                            textvariable=x_loc_entry)
-x_loc_entry_box.grid(column=2,
-                     row=3,
-                     rowspan=2,
-                     sticky=W+E)
-increment_entry_box = ttk.Entry(inputframe,
-                                width=7,
-                                textvariable=increment_entry)
-increment_entry_box.grid(column=2,
-                         row=5,
-                         sticky=W+E)
-impact_factor_entry_box = ttk.Entry(inputframe,
-                                    width=7,
-                                    textvariable=impact_factor_entry)
-impact_factor_entry_box.grid(column=2,
-                             row=6,
+        ttk.Label(inputframe,
+                  text='x-Location:').grid(column=1,
+                                           row=3,
+                                           rowspan=2,
+                                           sticky=W+E)
+        ttk.Label(inputframe,
+                  text='Increment:').grid(column=1,
+                                          row=5,
+                                          sticky=W+E)
+        ttk.Label(inputframe,
+                  text='Impact Factor:').grid(column=1,
+                                              row=6,
+                                              sticky=W+E)
+        ttk.Label(inputframe,
+                  text='Distribution Factor:').grid(column=1,
+                                                    row=7,
+                                                    sticky=W+E)
+
+        # Create entry boxes and assign them to grid spaces
+        span_length_entry_box = ttk.Entry(
+            inputframe, width=7, textvariable=self.span_length_entry)
+        span_length_entry_box.grid(column=2,
+                                   row=2,
+                                   sticky=W+E)
+        x_loc_entry_box = ttk.Entry(
+            inputframe, width=7, textvariable=self.x_loc_entry)
+        x_loc_entry_box.grid(column=2,
+                             row=3,
+                             rowspan=2,
                              sticky=W+E)
-dist_factor_entry_box = ttk.Entry(inputframe,
-                                  width=7,
-                                  textvariable=dist_factor_entry)
-dist_factor_entry_box.grid(column=2,
-                           row=7,
-                           sticky=W+E)
-
-# Give impact and distribution factors and increment default values
-impact_factor_entry_box.insert(tkinter.END, '0')
-dist_factor_entry_box.insert(tkinter.END, '1')
-increment_entry_box.insert(tkinter.END, '1')
-
-# Create unit labels for entry boxes and radio button for x location
-# option, set default radiobutton, and assign them all grid positions
-ttk.Label(inputframe, text='feet').grid(column=3,
-                                       row=2,
-                                       sticky=W)
-rad1 = ttk.Radiobutton(inputframe,
-                       text='feet',
-                       variable=feet_or_frac_entry,
-                       value=1)
-rad1.grid(column=3,
-          row=3,
-          sticky=W)
-rad1.invoke()
-rad2 = ttk.Radiobutton(inputframe,
-                       text='span fraction',
-                       variable=feet_or_frac_entry,
-                       value=2)
-rad2.grid(column=3,
-          row=4,
-          sticky=W)
-ttk.Label(inputframe, text='inches').grid(column=3,
-                                         row=5,
-                                         sticky=W)
-
-# Create output text strings and locations for moment output
-# and assign them grid positions
-ttk.Label(resultframe, text='The maximum moment').grid(column=1,
-                                                     row=1,
-                                                     sticky=E)
-ttk.Label(resultframe,
-          textvariable=max_moment_disp,
-          font='-weight bold').grid(column=2,
-                                    row=1,
-                                    sticky=E)
-ttk.Label(resultframe,
-          text='kip-ft',
-          font='-weight bold').grid(column=3,
-                                    row=1,
-                                    sticky=W)
-ttk.Label(resultframe,
-          text=' occurs when the front of the train is ').grid(column=4,
-                                                               row=1,
-                                                               sticky=W)
-ttk.Label(resultframe,
-          textvariable=max_moment_loc_disp,
-          font='-weight bold').grid(column=5,
-                                    row=1,
-                                    sticky=E)
-ttk.Label(resultframe,
-          text='feet',
-          font='-weight bold').grid(column=6,
-                                    row=1,
-                                    sticky=W)
-ttk.Label(resultframe,
-          text=' past the last support.').grid(column=7,
-                                               row=1,
-                                               sticky=W)
+        increment_entry_box = ttk.Entry(
+            inputframe, width=7, textvariable=self.increment_entry)
+        increment_entry_box.grid(column=2,
+                                 row=5,
+                                 sticky=W+E)
+        impact_factor_entry_box = ttk.Entry(
+            inputframe, width=7, textvariable=self.impact_factor_entry)
+        impact_factor_entry_box.grid(column=2,
+                                     row=6,
+                                     sticky=W+E)
+        dist_factor_entry_box = ttk.Entry(
+            inputframe, width=7, textvariable=self.dist_factor_entry)
+        dist_factor_entry_box.grid(column=2,
+                                   row=7,
+                                   sticky=W+E)
+
+        # Give impact and distribution factors and increment default values
+        impact_factor_entry_box.insert(tkinter.END, '0')
+        dist_factor_entry_box.insert(tkinter.END, '1')
+        increment_entry_box.insert(tkinter.END, '1')
 
-# Create output text strings and locations for shear output
-# and assign them grid positions
-ttk.Label(resultframe,
-          text='The maximum shear').grid(column=1,
-                                         row=2,
-                                         sticky=E)
-ttk.Label(resultframe,
-          textvariable=max_shear_disp,
-          font='-weight bold').grid(column=2,
-                                    row=2,
-                                    sticky=E)
-ttk.Label(resultframe,
-          text='kips',
-          font='-weight bold').grid(column=3,
-                                    row=2,
-                                    sticky=W)
-ttk.Label(resultframe,
-          text=' occurs when the front of the train is ').grid(column=4,
-                                                               row=2,
-                                                               sticky=W)
-ttk.Label(resultframe,
-          textvariable=max_shear_loc_disp,
-          font='-weight bold').grid(column=5,
-                                    row=2,
-                                    sticky=E)
-ttk.Label(resultframe,
-          text='feet',
-          font='-weight bold').grid(column=6,
-                                    row=2,
-                                    sticky=W)
-ttk.Label(resultframe,
-          text=' past the last support.').grid(column=7,
+        # Create unit labels for entry boxes and radio button for x location
+        # option, set default radiobutton, and assign them all grid positions
+        ttk.Label(inputframe, text='feet').grid(column=3,
                                                row=2,
                                                sticky=W)
-
-# Create buttons
-ttk.Button(buttonframe,
-           text='Calculate',
-           command=calculate).grid(column=1,
-                                   row=1,
-                                   sticky=E+W)
-ttk.Button(buttonframe,
-           text='Reset',
-           command=clear).grid(column=2,
+        rad1 = ttk.Radiobutton(inputframe,
+                               text='feet',
+                               variable=self.feet_or_frac_entry,
+                               value=1)
+        rad1.grid(column=3,
+                  row=3,
+                  sticky=W)
+        rad1.invoke()
+        rad2 = ttk.Radiobutton(inputframe,
+                               text='span fraction',
+                               variable=self.feet_or_frac_entry,
+                               value=2)
+        rad2.grid(column=3,
+                  row=4,
+                  sticky=W)
+        ttk.Label(inputframe, text='inches').grid(column=3,
+                                                 row=5,
+                                                 sticky=W)
+
+        # Create method selector. Adaptive refines a coarse sweep down to
+        # the increment; exact only looks at critical train positions, so
+        # the increment is ignored.
+        ttk.Label(inputframe,
+                  text='Method:').grid(column=1,
+                                       row=8,
+                                       sticky=W+E)
+        method_box = ttk.Combobox(inputframe,
+                                  width=9,
+                                  textvariable=self.method_entry,
+                                  values=list(METHODS),
+                                  state='readonly')
+        method_box.grid(column=2,
+                        row=8,
+                        columnspan=2,
+                        sticky=W)
+        method_box.current(0)
+
+        # Create train selector, with the built-in trains and any from the
+        # user's train files
+        ttk.Label(inputframe,
+                  text='Train:').grid(column=1,
+                                      row=9,
+                                      sticky=W+E)
+        train_names = trains.train_names()
+        train_box = ttk.Combobox(inputframe,
+                                 width=13,
+                                 textvariable=self.train_entry,
+                                 values=train_names,
+                                 state='readonly')
+        train_box.grid(column=2,
+                       row=9,
+                       columnspan=2,
+                       sticky=W)
+        train_box.current(train_names.index(trains.DEFAULT_TRAIN))
+
+        # Create output text strings and locations for moment output
+        # and assign them grid positions
+        ttk.Label(resultframe, text='The maximum moment').grid(column=1,
+                                                             row=1,
+                                                             sticky=E)
+        ttk.Label(resultframe,
+                  textvariable=self.max_moment_disp,
+                  font='-weight bold').grid(column=2,
+                                            row=1,
+                                            sticky=E)
+        ttk.Label(resultframe,
+                  text='kip-ft',
+                  font='-weight bold').grid(column=3,
+                                            row=1,
+                                            sticky=W)
+        ttk.Label(resultframe,
+                  text=' occurs when the front of the train is ').grid(
+                      column=4, row=1, sticky=W)
+        ttk.Label(resultframe,
+                  textvariable=self.max_moment_loc_disp,
+                  font='-weight bold').grid(column=5,
+                                            row=1,
+                                            sticky=E)
+        ttk.Label(resultframe,
+                  text='feet',
+                  font='-weight bold').grid(column=6,
+                                            row=1,
+                                            sticky=W)
+        ttk.Label(resultframe,
+                  text=' past the last support.').grid(column=7,
+                                                       row=1,
+                                                       sticky=W)
+
+        # Create output text strings and locations for shear output
+        # and assign them grid positions
+        ttk.Label(resultframe,
+                  text='The maximum shear').grid(column=1,
+                                                 row=2,
+                                                 sticky=E)
+        ttk.Label(resultframe,
+                  textvariable=self.max_shear_disp,
+                  font='-weight bold').grid(column=2,
+                                            row=2,
+                                            sticky=E)
+        ttk.Label(resultframe,
+                  text='kips',
+                  font='-weight bold').grid(column=3,
+                                            row=2,
+                                            sticky=W)
+        ttk.Label(resultframe,
+                  text=' occurs when the front of the train is ').grid(
+                      column=4, row=2, sticky=W)
+        ttk.Label(resultframe,
+                  textvariable=self.max_shear_loc_disp,
+                  font='-weight bold').grid(column=5,
+                                            row=2,
+                                            sticky=E)
+        ttk.Label(resultframe,
+                  text='feet',
+                  font='-weight bold').grid(column=6,
+                                            row=2,
+                                            sticky=W)
+        ttk.Label(resultframe,
+                  text=' past the last support.').grid(column=7,
+                                                       row=2,
+                                                       sticky=W)
+
+        # Create buttons
+        ttk.Button(buttonframe,
+                   text='Calculate',
+                   command=self.calculate).grid(column=1,
+                                                row=1,
+                                                sticky=E+W)
+        ttk.Button(buttonframe,
+                   text='Reset',
+                   command=self.clear).grid(column=2,
+                                            row=1,
+                                            sticky=E+W)
+        ttk.Button(buttonframe,
+                   text='Moment Train Position',
+                   command=self.show_plot_moment).grid(column=3,
+                                                       row=1,
+                                                       sticky=E+W)
+        ttk.Button(buttonframe,
+                   text='Shear Train Position',
+                   command=self.show_plot_shear).grid(column=4,
+                                                      row=1,
+                                                      sticky=E + W)
+        ttk.Button(buttonframe,
+                   text='Animate Crossing',
+                   command=self.animate).grid(column=5,
+                                              row=1,
+                                              sticky=E+W)
+
+        # Create elements inside nframe
+        ttk.Label(nframe,
+                  text='Number of points for n-th point plots:').grid(
+                      column=1, row=1, sticky=W+E)
+        nth_points_entry_box = ttk.Entry(nframe,
+                                         width=7,
+                                         textvariable=self.nth_points_entry)
+        nth_points_entry_box.grid(column=2,
+                                  row=1,
+                                  sticky=W)
+        ttk.Button(nframe,
+                   text='N-th Point Max Moment Plot',
+                   command=self.nth_point_moment).grid(column=1,
+                                                       row=2,
+                                                       sticky=W+E)
+        ttk.Button(nframe,
+                   text='N-th Point Max Shear Plot',
+                   command=self.nth_point_shear).grid(column=2,
+                                                      row=2,
+                                                      sticky=W+E)
+
+        # Create progress bar and cancel button for long calculations
+        progressframe = ttk.Frame(mainframe, padding='8 0 8 8')
+        progressframe.grid(column=1, row=4, columnspan=2, sticky=N+S+E+W)
+        progressframe.columnconfigure(1, weight=1)
+
+        self.progress_bar = ttk.Progressbar(progressframe,
+                                            orient=tkinter.HORIZONTAL,
+                                            mode='determinate',
+                                            maximum=100)
+        self.progress_bar.grid(column=1,
                                row=1,
                                sticky=E+W)
-ttk.Button(buttonframe,
-           text='Moment Train Position',
-           command=show_plot_moment).grid(column=3,
-                                          row=1,
-                                          sticky=E+W)
-ttk.Button(buttonframe,
-           text='Shear Train Position',
-           command=show_plot_shear).grid(column=4,
-                                         row=1,
-                                         sticky=E + W)
-
-# Create elements inside nframe
-ttk.Label(nframe,
-          text='Number of points for n-th point plots:').grid(column=1,
-                                                              row=1,
-                                                              sticky=W+E)
-nth_points_entry = tkinter.StringVar()
-nth_points_entry_box = ttk.Entry(nframe,
-                                 width=7,
-                                 textvariable=nth_points_entry)
-nth_points_entry_box.grid(column=2,
-                          row=1,
-                          sticky=W)
-ttk.Button(nframe,
-           text='N-th Point Max Moment Plot',
-           command=nth_point_moment).grid(column=1,
-                                          row=2,
+        self.cancel_button = ttk.Button(progressframe,
+                                        text='Cancel',
+                                        command=self.cancel,
+                                        state=tkinter.DISABLED)
+        self.cancel_button.grid(column=2,
+                                row=1,
+                                sticky=E)
+
+        # Status line with the timings and counts of the last calculation
+        # or plot
+        self.status_disp = tkinter.StringVar()
+        ttk.Label(mainframe,
+                  textvariable=self.status_disp,
+                  padding='8 0 8 4',
+                  foreground='gray').grid(column=1,
+                                          row=5,
+                                          columnspan=2,
                                           sticky=W+E)
-ttk.Button(nframe,
-           text='N-th Point Max Shear Plot',
-           command=nth_point_shear).grid(column=2,
-                                         row=2,
-                                         sticky=W+E)
-
-# Make cursor open in first box on open
-span_length_entry_box.focus()
-
-# Set Return key to calculate function
-root.bind('<Return>', calculate)
-
-# Make sure python is in front when opened on OS X
-if sys.platform == 'darwin':
-    os.system('''/usr/bin/osascript -e 'tell app "Finder"\
-              to set frontmost of process "Python" to true' ''')
 
-# Begin main loop (open window)
-root.mainloop()
\ No newline at end of file
+        # Create frame for the plots. The figure in it is made the first
+        # time something is plotted and reused after that.
+        self.plotframe = ttk.Frame(mainframe)
+        self.plotframe.grid(column=1, row=6, columnspan=2, sticky=N+S+E+W)
+        self.plotframe.columnconfigure(0, weight=1)
+        self.plotframe.rowconfigure(0, weight=1)
+        mainframe.rowconfigure(6, weight=4)
+        self.plot_panel = None
+
+        # Heavy calculations run one at a time on a worker thread so the
+        # window stays responsive
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.job = None
+        self.job_done = None
+        self.job_progress = 0
+        self.cancel_event = threading.Event()
+        root.protocol('WM_DELETE_WINDOW', self.close)
+
+        # Make cursor open in first box on open
+        span_length_entry_box.focus()
+
+        # Set Return key to calculate function
+        root.bind('<Return>', self.calculate)
+
+    def read_span(self):
+        # Span length and x location (in feet) from the input boxes
+        span_length = float(self.span_length_entry.get())
+        x_loc = engine.resolve_x_loc(span_length,
+                                     float(self.x_loc_entry.get()),
+                                     self.feet_or_frac_entry.get() == 2)
+        return span_length, x_loc
+
+    def read_factors(self):
+        return (float(self.increment_entry.get()),
+                float(self.impact_factor_entry.get()),
+                float(self.dist_factor_entry.get()))
+
+    def selected_engine(self):
+        return METHODS[self.method_entry.get()]
+
+    def selected_train(self):
+        return self.train_entry.get()
+
+    def run_in_background(self, work, done):
+        # Call work(progress) on the worker thread, then done(result) back
+        # on the Tk thread. progress raises engine.Cancelled once Cancel has
+        # been pressed.
+        if self.job is not None:
+            self.messagebox.showinfo('Busy', 'A calculation is running.')
+            return
+        self.cancel_event.clear()
+        self.job_progress = 0
+        self.job = self.executor.submit(work, self.report_progress)
+        self.job_done = done
+        self.cancel_button.state(['!disabled'])
+        self.root.after(POLL_INTERVAL, self.poll_job)
+
+    def report_progress(self, fraction):
+        # Called on the worker thread, so it only records the fraction; the
+        # bar is updated by poll_job
+        if self.cancel_event.is_set():
+            raise engine.Cancelled()
+        self.job_progress = fraction
+
+    def poll_job(self):
+        self.progress_bar['value'] = 100*self.job_progress
+        if not self.job.done():
+            self.root.after(POLL_INTERVAL, self.poll_job)
+            return
+
+        # Back to idle before the result is looked at, so that nothing the
+        # job raised can leave the window busy
+        job = self.job
+        done = self.job_done
+        self.job = None
+        self.job_done = None
+        self.progress_bar['value'] = 0
+        self.cancel_button.state(['disabled'])
+        try:
+            result = job.result()
+        except engine.Cancelled:
+            return
+        except ValueError:
+            self.messagebox.showerror('Error', 'Invalid Input!')
+            return
+        except Exception as error:
+            self.status_disp.set('')
+            self.messagebox.showerror(
+                'Error', 'The calculation failed: %s: %s'
+                % (type(error).__name__, error))
+            return
+        done(result)
+
+    def cancel(self, *args):
+        self.cancel_event.set()
+
+    def close(self):
+        self.cancel_event.set()
+        self.executor.shutdown(wait=False)
+        self.root.destroy()
+
+    def calculate(self, *args):
+        # Get values from input
+        try:
+            span_length, x_loc = self.read_span()
+            increment, impact_factor, dist_factor = self.read_factors()
+            engine.check_inputs(span_length, increment)
+        except ValueError:
+            self.messagebox.showerror('Error', 'Invalid Input!')
+            return
+
+        engine_name = self.selected_engine()
+        train = self.selected_train()
+        use_table = (self.table is not None and engine_name is None
+                     and self.feet_or_frac_entry.get() == 2)
+        stats = profiling.Stats()
+
+        def work(progress):
+            if use_table:
+                # Span fractions can be looked up in the envelope table,
+                # if it was built at this increment
+                with stats.phase('table'):
+                    return self.table.calculate(span_length, x_loc,
+                                                increment, impact_factor,
+                                                dist_factor, cache=self.cache,
+                                                train=train)
+            return engine.calculate(span_length, x_loc, increment,
+                                    impact_factor, dist_factor,
+                                    engine=engine_name, cache=self.cache,
+                                    progress=progress, train=train,
+                                    stats=stats)
+
+        def done(result):
+            self.show_result(result)
+            self.show_stats(stats)
+            # Say so when the values are interpolated rather than swept
+            if use_table and self.table.covers(span_length,
+                                               x_loc/span_length, increment,
+                                               train):
+                self.status_disp.set(self.table.describe() + ' | '
+                                     + stats.summary())
+
+        self.run_in_background(work, done)
+
+    def show_result(self, result):
+        # Set values in GUI to calculated values
+        self.max_moment_disp.set(round(result.max_moment, 2))
+        self.max_shear_disp.set(round(result.max_shear, 2))
+        self.max_moment_loc_disp.set(round(result.moment_position, 2))
+        self.max_shear_loc_disp.set(round(result.shear_position, 2))
+
+    def show_stats(self, stats):
+        self.status_disp.set(stats.summary())
+
+    def clear(self, *args):
+
+        # Set all "settable" labels in GUI to nothing
+        self.max_moment_disp.set('')
+        self.max_shear_disp.set('')
+        self.max_moment_loc_disp.set('')
+        self.max_shear_loc_disp.set('')
+
+    def show_plot(self, position_disp, title):
+        # Get input
+        try:
+            span_length, x_loc = self.read_span()
+        except ValueError:
+            self.messagebox.showerror('Error', 'Invalid Input!')
+            return
+
+        try:
+            axle_pos = float(position_disp.get())
+        except ValueError:
+            self.messagebox.showerror('Error',
+                                      'Train position not calculated!')
+            return
+
+        stats = profiling.Stats()
+        try:
+            consist = trains.get_train(self.selected_train()).consist(
+                span_length)
+        except ValueError:
+            self.messagebox.showerror('Error', 'Invalid Input!')
+            return
+        with stats.phase('plot'):
+            self.plots().show_train(span_length, x_loc, axle_pos, title,
+                                    consist)
+        self.show_stats(stats)
+
+    def show_plot_moment(self, *args):
+        self.show_plot(self.max_moment_loc_disp,
+                       'Train Position for Max Moment')
+
+    def show_plot_shear(self, *args):
+        self.show_plot(self.max_shear_loc_disp,
+                       'Train Position for Max Shear')
+
+    def animate(self, *args):
+        # Run the train across the span with the moment and shear at the
+        # section traced as it goes. The whole history is worked out first
+        # on the worker thread, so drawing the frames needs no calculation.
+        try:
+            span_length, x_loc = self.read_span()
+            increment, impact_factor, dist_factor = self.read_factors()
+            engine.check_inputs(span_length, increment)
+            train = self.selected_train()
+            consist = trains.get_train(train).consist(span_length)
+        except ValueError:
+            self.messagebox.showerror('Error', 'Invalid Input!')
+            return
+
+        stats = profiling.Stats()
+
+        engine_name = self.selected_engine()
+
+        def work(progress):
+            # With the engine from the Method box, so the trace matches
+            # the result shown for it
+            with stats.phase('sweep'):
+                return engine.history(span_length, x_loc, increment,
+                                      impact_factor, dist_factor,
+                                      engine=engine_name, progress=progress,
+                                      train=train)
+
+        def done(history):
+            positions, m_array, v_array = history
+            stats.count('positions', len(positions))
+            with stats.phase('plot'):
+                self.plots().animate(span_length, x_loc, consist, positions,
+                                     m_array, v_array,
+                                     'Train Crossing, Section at '
+                                     + str(round(x_loc, 2)) + ' ft')
+            self.show_stats(stats)
+
+        self.run_in_background(work, done)
+
+    def plots(self):
+        # The embedded figure, made on first use
+        if self.plot_panel is None:
+            import plotting
+            self.plot_panel = plotting.PlotPanel(self.plotframe)
+            self.plot_panel.widget.grid(column=0, row=0, sticky='nsew')
+        return self.plot_panel
+
+    def start_envelope(self, done):
+        # Both n-th point plots come from one envelope calculation, which
+        # the cache keeps until the span, n or increment change
+        try:
+            span_length = float(self.span_length_entry.get())
+            n = int(self.nth_points_entry.get())
+            increment, impact_factor, dist_factor = self.read_factors()
+            engine.check_inputs(span_length, increment, n)
+        except ValueError:
+            self.messagebox.showerror('Error', 'Invalid Input!')
+            return
+
+        engine_name = self.selected_engine()
+        train = self.selected_train()
+        stats = profiling.Stats()
+
+        def work(progress):
+            return engine.envelope(span_length, n, increment, impact_factor,
+                                   dist_factor, engine=engine_name,
+                                   cache=self.cache, progress=progress,
+                                   train=train, stats=stats)
+
+        def plot(envelope):
+            done(envelope, stats)
+            self.show_stats(stats)
+
+        self.run_in_background(work, plot)
+
+    def nth_point_moment(self, *args):
+        self.start_envelope(self.plot_moment_envelope)
+
+    def nth_point_shear(self, *args):
+        self.start_envelope(self.plot_shear_envelope)
+
+    def plot_moment_envelope(self, envelope, stats):
+        with stats.phase('plot'):
+            self.plots().show_series(
+                envelope.x_locs,
+                [(envelope.max_moments, 'Maximum Moment')],
+                'Maximum Moment, kip-ft',
+                'Maximum Moment at ' + str(len(envelope.x_locs) - 1) +
+                'th Points Along Span')
+
+    def plot_shear_envelope(self, envelope, stats):
+        with stats.phase('plot'):
+            self.plots().show_series(
+                envelope.x_locs,
+                [(envelope.max_shears, 'Positive Shear'),
+                 (envelope.min_shears, 'Negative Shear')],
+                'Maximum Shear, kips',
+                'Maximum Shear at ' + str(len(envelope.x_locs) - 1) +
+                'th Points Along Span')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    # With arguments, run the command-line batch mode instead of the window
+    if argv:
+        import cli
+        return cli.main(argv)
+
+    import tkinter
+
+    # Initialize root window and build the calculator inside it
+    root = tkinter.Tk()
+    Calculator(root)
+
+    # Make sure python is in front when opened on OS X
+    if sys.platform == 'darwin':
+        os.system('''/usr/bin/osascript -e 'tell app "Finder"\
+                  to set frontmost of process "Python" to true' ''')
+
+    # Begin main loop (open window)
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
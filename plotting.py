@@ -0,0 +1,258 @@
+# Plots for the calculator window.
+#
+# Everything is drawn on one matplotlib Figure embedded in the window, made
+# the first time a plot is asked for and reused after that, so nothing
+# goes through pyplot's global state. The train diagram draws all its
+# axles as one LineCollection with one scatter for the axle ends, and a new
+# train position only updates those artists' data.
+#
+# Traversal animates the train crossing the span from a precomputed
+# moment/shear history, blitting only the artists that move, so a frame
+# costs no calculation and little drawing.
+#
+# Requires matplotlib (and tkinter for PlotPanel).
+
+import math
+
+import numpy as np
+from matplotlib.animation import FuncAnimation
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+
+
+# Drawn load height per kip (and per kip/ft for uniform loads)
+LOAD_SCALE = 1/4
+
+# Space left either side of the span in the train diagram, in feet
+MARGIN = 20
+
+# Animation frame rate, and how long a train takes to cross at most. Long
+# histories skip positions to keep to it.
+FRAMES_PER_SECOND = 60
+TRAVERSAL_SECONDS = 12
+
+
+def axle_segments(consist, front):
+    # One vertical line per axle, from the rail up by its load, with the
+    # front of the train front feet from the first support
+    x = front - consist.arrays.offsets
+    tops = 1 + consist.arrays.loads*LOAD_SCALE
+    segments = np.empty((len(x), 2, 2))
+    segments[:, :, 0] = x[:, None]
+    segments[:, 0, 1] = 1
+    segments[:, 1, 1] = tops
+    return segments
+
+
+def uniform_polygons(consist, front, left, right):
+    # A band for each uniform load, cut off at left and right
+    polygons = []
+    for start, end, load in consist.segments:
+        near = min(front - start, right)
+        far = max(front - end, left)
+        if near > far:
+            top = 1 + load*LOAD_SCALE
+            polygons.append([(far, 1), (near, 1), (near, top), (far, top)])
+    return polygons
+
+
+class TrainPlot:
+    # Train position diagram on an Axes. The artists are made once; update
+    # moves them for a new span, section or train position.
+
+    def __init__(self, ax):
+        self.ax = ax
+        self.span_line, = ax.plot([], [], color='b')
+        self.supports = ax.scatter([], [], color='b', marker='^')
+        self.rollers = ax.scatter([], [], color='b', marker='o')
+        self.axles = LineCollection([], colors='r')
+        ax.add_collection(self.axles)
+        self.axle_ends = ax.scatter([], [], color='r', marker='v', s=20)
+        self.uniform = PolyCollection([], facecolors='r', alpha=0.3,
+                                      linewidths=0)
+        ax.add_collection(self.uniform)
+        self.section_line, = ax.plot([], [], color='y')
+        self.section = ax.scatter([], [], color='y', marker='^')
+        ax.get_xaxis().set_visible(False)
+        ax.get_yaxis().set_visible(False)
+
+    def update(self, span_length, x_loc, axle_pos, title, consist):
+        # axle_pos is the position of the front of the train past the last
+        # support, as in engine.Result
+        self.span_length = span_length
+        self.consist = consist
+        self.span_line.set_data([0, span_length], [0, 0])
+        self.supports.set_offsets([[0, -0.7]])
+        self.rollers.set_offsets([[span_length, -0.7]])
+        self.move(axle_pos)
+
+        self.section_line.set_data([x_loc, x_loc], [-1, -5])
+        self.section.set_offsets([[x_loc, -1]])
+        self.ax.axis([-MARGIN, span_length + MARGIN, -30, 60])
+        self.ax.set_title(title)
+
+    def move(self, axle_pos):
+        # Move the train only, returning the artists that changed
+        front = axle_pos + self.span_length
+        segments = axle_segments(self.consist, front)
+        self.axles.set_segments(segments)
+        self.axle_ends.set_offsets(segments[:, 0])
+        self.uniform.set_verts(uniform_polygons(
+            self.consist, front, -MARGIN, self.span_length + MARGIN))
+        return [self.axles, self.axle_ends, self.uniform]
+
+
+def plot_series(ax, x_locs, series, ylabel, title):
+    # Lines along the span. series is a list of (values, label) pairs.
+    ax.get_xaxis().set_visible(True)
+    ax.get_yaxis().set_visible(True)
+    for values, label in series:
+        ax.plot(x_locs, values, label=label)
+    if len(series) > 1:
+        ax.legend()
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel('Span Position, ft')
+    ax.set_title(title)
+
+
+def decimate(positions, values, frames):
+    # A shorter trace for drawing: between each frame and the one before,
+    # only the lowest and highest values and the frame's own are kept, so
+    # every peak is still drawn. Returns the trace and, for each frame,
+    # how much of it to draw.
+    keep = []
+    ends = []
+    start = 0
+    for frame in frames:
+        bucket = values[start:frame + 1]
+        keep += sorted({start + int(np.argmin(bucket)),
+                        start + int(np.argmax(bucket)), frame})
+        ends.append(len(keep))
+        start = frame + 1
+    return positions[keep], values[keep], ends
+
+
+def padded_limits(values):
+    low = min(float(np.min(values)), 0)
+    high = max(float(np.max(values)), 0)
+    pad = 0.05*(high - low) or 1
+    return low - pad, high + pad
+
+
+class Traversal:
+    # The train crossing the span, with the moment and shear at the section
+    # traced underneath as it goes. positions, m_array and v_array are the
+    # history from an engine sweep; each frame only moves the train and
+    # extends the traces, and only those artists are redrawn.
+
+    def __init__(self, figure, span_length, x_loc, consist, positions,
+                 m_array, v_array, title):
+        self.positions = np.asarray(positions, dtype=float)
+        self.m_array = np.asarray(m_array, dtype=float)
+        self.v_array = np.asarray(v_array, dtype=float)
+
+        train_ax, moment_ax = figure.subplots(
+            2, 1, gridspec_kw={'height_ratios': [3, 2]})
+        shear_ax = moment_ax.twinx()
+        self.train_plot = TrainPlot(train_ax)
+        self.train_plot.update(span_length, x_loc, self.positions[0], title,
+                               consist)
+
+        # Traces so far, with a dot at the current values. (Text is kept
+        # out of the frames: laying it out costs more than the rest of a
+        # frame put together.)
+        self.moment_line, = moment_ax.plot([], [], color='C0')
+        self.shear_line, = shear_ax.plot([], [], color='C1')
+        self.moment_dot, = moment_ax.plot([], [], 'o', color='C0')
+        self.shear_dot, = shear_ax.plot([], [], 'o', color='C1')
+        moment_ax.set_xlim(self.positions[0], self.positions[-1])
+        moment_ax.set_ylim(*padded_limits(self.m_array))
+        shear_ax.set_ylim(*padded_limits(self.v_array))
+        moment_ax.set_xlabel('Front of Train Past Last Support, ft')
+        moment_ax.set_ylabel('Moment, kip-ft', color='C0')
+        shear_ax.set_ylabel('Shear, kips', color='C1')
+
+        # Every stride-th position, and always the last
+        stride = max(1, math.ceil(len(self.positions)
+                                  / (FRAMES_PER_SECOND*TRAVERSAL_SECONDS)))
+        frames = list(range(0, len(self.positions), stride))
+        if frames[-1] != len(self.positions) - 1:
+            frames.append(len(self.positions) - 1)
+
+        self.frame_positions = self.positions[frames]
+        self.moment_trace = decimate(self.positions, self.m_array, frames)
+        self.shear_trace = decimate(self.positions, self.v_array, frames)
+        self.animation = FuncAnimation(figure, self.draw_frame,
+                                       range(len(frames)),
+                                       init_func=self.init_frame,
+                                       interval=1000/FRAMES_PER_SECOND,
+                                       blit=True, repeat=False)
+
+    def artists(self):
+        return [self.train_plot.axles, self.train_plot.axle_ends,
+                self.train_plot.uniform, self.moment_line, self.shear_line,
+                self.moment_dot, self.shear_dot]
+
+    def init_frame(self):
+        for line in (self.moment_line, self.shear_line, self.moment_dot,
+                     self.shear_dot):
+            line.set_data([], [])
+        return self.artists()
+
+    def draw_frame(self, k):
+        # Slices of the traces are views, so nothing is copied. A frame's
+        # own position is the last point of its part of the trace.
+        self.train_plot.move(self.frame_positions[k])
+        for line, dot, (x, y, ends) in (
+                (self.moment_line, self.moment_dot, self.moment_trace),
+                (self.shear_line, self.shear_dot, self.shear_trace)):
+            stop = ends[k]
+            line.set_data(x[:stop], y[:stop])
+            dot.set_data(x[stop - 1:stop], y[stop - 1:stop])
+        return self.artists()
+
+    def stop(self):
+        self.animation.event_source.stop()
+
+
+class PlotPanel:
+    # The window's figure, embedded in a Tk widget. It shows either the
+    # train diagram or an n-th point plot; switching between them clears
+    # the axes, but redrawing the train diagram only updates it.
+
+    def __init__(self, master, figsize=(8, 4)):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.figure = Figure(figsize=figsize)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.widget = self.canvas.get_tk_widget()
+        self.train_plot = None
+        self.traversal = None
+
+    def reset(self):
+        # Stop any animation and start again with an empty figure
+        if self.traversal is not None:
+            self.traversal.stop()
+            self.traversal = None
+        self.train_plot = None
+        self.figure.clear()
+
+    def show_train(self, span_length, x_loc, axle_pos, title, consist):
+        if self.train_plot is None:
+            self.reset()
+            self.train_plot = TrainPlot(self.figure.add_subplot())
+        self.train_plot.update(span_length, x_loc, axle_pos, title, consist)
+        self.canvas.draw()
+
+    def show_series(self, x_locs, series, ylabel, title):
+        self.reset()
+        plot_series(self.figure.add_subplot(), x_locs, series, ylabel,
+                    title)
+        self.canvas.draw()
+
+    def animate(self, span_length, x_loc, consist, positions, m_array,
+                v_array, title):
+        self.reset()
+        self.traversal = Traversal(self.figure, span_length, x_loc, consist,
+                                   positions, m_array, v_array, title)
+        self.canvas.draw()
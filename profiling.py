@@ -0,0 +1,130 @@
+# Opt-in instrumentation.
+#
+# Pass a Stats as stats= to engine.calculate or engine.envelope to find out
+# where the time goes: time per phase (building the consist, the sweep,
+# which includes building the position grid, reducing the histories to
+# maximums, and plotting in the window), how many train positions and axle
+# evaluations were needed, cache hits and, with trace_memory=True, the peak
+# memory allocated. Without a Stats nothing is measured.
+
+import collections
+import contextlib
+import time
+import tracemalloc
+
+
+class Stats:
+    # Accumulates over every call it is passed to, so one Stats can cover
+    # a whole batch
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.phases = collections.OrderedDict()
+        self.counts = collections.Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.peak_memory = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # Add the time spent in the block to the named phase
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (self.phases.get(name, 0)
+                                 + time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def memory(self):
+        # Record the peak memory allocated in the block over what was
+        # already allocated, if trace_memory is set
+        if not self.trace_memory:
+            yield
+            return
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] - base
+            if started:
+                tracemalloc.stop()
+            self.peak_memory = max(self.peak_memory or 0, peak)
+
+    def count(self, name, amount=1):
+        self.counts[name] += amount
+
+    def cache_lookup(self, hit):
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+    @property
+    def cache_hit_rate(self):
+        # Fraction of cache lookups that were hits, or None if there were
+        # none
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits/lookups if lookups else None
+
+    @property
+    def total_time(self):
+        return sum(self.phases.values())
+
+    def merge(self, other):
+        # Add in another Stats, from a worker process say
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0) + seconds
+        self.counts.update(other.counts)
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        if other.peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, other.peak_memory)
+        return self
+
+    def as_dict(self):
+        return {'phases': dict(self.phases),
+                'counts': dict(self.counts),
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'cache_hit_rate': self.cache_hit_rate,
+                'peak_memory': self.peak_memory}
+
+    def summary(self):
+        # One line for a status bar or a log
+        parts = [', '.join('%s %s' % (name, format_seconds(seconds))
+                           for name, seconds in self.phases.items())]
+        if self.counts:
+            parts.append(', '.join('{:,} {}'.format(count,
+                                                     name.replace('_', ' '))
+                                   for name, count in self.counts.items()))
+        if self.cache_hit_rate is not None:
+            parts.append('cache %d/%d hits' % (
+                self.cache_hits, self.cache_hits + self.cache_misses))
+        if self.peak_memory is not None:
+            parts.append('peak %.1f MB' % (self.peak_memory/2**20))
+        return ' | '.join(part for part in parts if part)
+
+
+def format_seconds(seconds):
+    if seconds < 1:
+        return '%.1f ms' % (1000*seconds)
+    return '%.2f s' % seconds
+
+
+def phase(stats, name):
+    # stats.phase(name), or nothing if stats is None
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.phase(name)
+
+
+def memory(stats):
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.memory()
@@ -0,0 +1,181 @@
+# Support reactions for a chain of simple spans.
+#
+# Each span is simply supported, and neighbouring spans share a pier, so a
+# pier carries the right-hand reaction of one span plus the left-hand
+# reaction of the next. The heaviest pier load often comes with the train
+# straddling the two. The reaction at a support is the load on the span to
+# its left times the distance from that span's far end, plus the same for
+# the span to its right. The axles on a span are a contiguous run of the
+# train, so, as in the engine's running-sum sweep, each side of each
+# support comes from the running sums of load and load x offset at the
+# ends of its run. All supports are done in one pass over the train
+# positions. Uniform loads are added in closed form.
+# Requires numpy.
+#
+#     python reactions.py 60 80 60 --train E80
+
+import argparse
+import collections
+import sys
+
+import numpy as np
+
+import engine
+import profiling
+import trains
+
+
+# Factored maximum reaction at each support (abutments first and last) and
+# at each span's bearings (the span's own part of the reaction at each
+# end, as (left, right) lists), with the train positions that cause them.
+# Positions are of the front of the train past the far end of the chain.
+ReactionEnvelope = collections.namedtuple('ReactionEnvelope', [
+    'supports',
+    'max_reactions',
+    'reaction_positions',
+    'max_left_bearings',
+    'left_bearing_positions',
+    'max_right_bearings',
+    'right_bearing_positions'])
+
+
+def ramp_area(near, far, u):
+    # Area under the line rising from 0 at near to 1 at far, between near
+    # and u (clipped to lie between them). near can be more than far.
+    length = far - near
+    t = np.clip((u - near)/length, 0, 1)
+    return abs(length)*t*t/2
+
+
+def span_reactions(span_start, span_end, front, offsets, sums, moments,
+                   consist):
+    # Left and right reactions of one span for every train front position
+    # (front is feet from the first abutment). The span's axles are those
+    # with span_start <= front - offset <= span_end: an axle right at a
+    # support counts fully towards the bearing there.
+    length = span_end - span_start
+    lo = np.searchsorted(offsets, front - span_end, 'left')
+    hi = np.searchsorted(offsets, front - span_start, 'right')
+    load = sums[hi] - sums[lo]
+    # Sum of load x distance from the span's left end
+    moment = load*(front - span_start) - moments[hi] + moments[lo]
+    right = moment/length
+    left = load - right
+
+    for start, end, w in consist.segments:
+        rear = front - end
+        ahead = front - start
+        left += w*(ramp_area(span_end, span_start, rear)
+                   - ramp_area(span_end, span_start, ahead))
+        right += w*(ramp_area(span_start, span_end, ahead)
+                    - ramp_area(span_start, span_end, rear))
+    return left, right
+
+
+def unfactored_envelope(spans, increment=1, progress=None, train=None,
+                        stats=None):
+    supports = [0.0]
+    for span in spans:
+        supports.append(supports[-1] + span)
+    total = supports[-1]
+    with profiling.phase(stats, 'consist'):
+        consist = trains.get_train(train).consist(total)
+
+    with profiling.phase(stats, 'sweep'):
+        positions = engine.position_grid(total, consist.length, increment)
+        front = total + positions
+        arrays = consist.arrays
+        offsets, sums, moments = (arrays.offsets, arrays.sums,
+                                  arrays.moments)
+        ends = []
+        for i in range(len(spans)):
+            if progress is not None:
+                progress(i/len(spans))
+            ends.append(span_reactions(supports[i], supports[i + 1], front,
+                                       offsets, sums, moments, consist))
+    # The reactions come from running sums, as in the window engine
+    engine.count_work(stats, positions, consist, 'window')
+
+    with profiling.phase(stats, 'reduction'):
+        envelope = ReactionEnvelope(supports, [], [], [], [], [], [])
+
+        def peak(values, maxima, at):
+            index, value = engine.max_index(values)
+            maxima.append(value)
+            at.append(float(positions[index]))
+
+        zero = np.zeros(len(positions))
+        for i in range(len(supports)):
+            from_left = ends[i - 1][1] if i > 0 else zero
+            from_right = ends[i][0] if i < len(spans) else zero
+            # An axle right on a pier is in both spans' bearings, but only
+            # once in the pier's reaction
+            on_pier = zero
+            if 0 < i < len(spans):
+                on_pier = (sums[np.searchsorted(offsets, front - supports[i],
+                                                'right')]
+                           - sums[np.searchsorted(offsets,
+                                                  front - supports[i],
+                                                  'left')])
+            peak(from_left + from_right - on_pier, envelope.max_reactions,
+                 envelope.reaction_positions)
+        for left, right in ends:
+            peak(left, envelope.max_left_bearings,
+                 envelope.left_bearing_positions)
+            peak(right, envelope.max_right_bearings,
+                 envelope.right_bearing_positions)
+
+    return envelope
+
+
+def envelope(spans, increment=1, impact_factor=0, dist_factor=1,
+             cache=None, progress=None, train=None, stats=None):
+    # Maximum support and bearing reactions for a train crossing a chain
+    # of simple spans (feet, in order). cache, progress, train and stats
+    # are as for engine.envelope.
+    engine.check_spans(spans)
+    engine.check_inputs(min(spans), increment)
+    spans = [float(span) for span in spans]
+
+    with profiling.memory(stats):
+        result = ReactionEnvelope(*engine.fetch(
+            cache, 'reactions', [spans, increment, engine.train_key(train)],
+            lambda: unfactored_envelope(spans, increment, progress, train,
+                                        stats),
+            stats))
+
+    return engine.factor_envelope(result, impact_factor, dist_factor)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Support reactions for a chain of simple spans.')
+    parser.add_argument('spans', nargs='+', type=float,
+                        help='span lengths in feet, in order')
+    parser.add_argument('--increment', type=float, default=1,
+                        help='increment in inches')
+    parser.add_argument('--impact', type=float, default=0,
+                        help='impact factor')
+    parser.add_argument('--dist', type=float, default=1,
+                        help='distribution factor')
+    parser.add_argument('--train', choices=trains.train_names())
+    args = parser.parse_args(argv)
+
+    try:
+        result = envelope(args.spans, args.increment, args.impact,
+                          args.dist, train=args.train)
+    except ValueError as error:
+        parser.error(str(error))
+
+    print('%12s %14s %12s' % ('Support, ft', 'Reaction, k', 'Position'))
+    for row in zip(result.supports, result.max_reactions,
+                   result.reaction_positions):
+        print('%12.2f %14.1f %12.2f' % row)
+    print('%12s %14s %14s' % ('Span', 'Left bearing', 'Right bearing'))
+    for i, row in enumerate(zip(result.max_left_bearings,
+                                result.max_right_bearings)):
+        print('%12d %14.1f %14.1f' % ((i + 1,) + row))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
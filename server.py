@@ -0,0 +1,428 @@
+# Local calculation service.
+#
+# Serves engine.calculate and the envelopes over HTTP/JSON, so several
+# users and scripts can share one warm process instead of each running the
+# calculator window:
+#
+#     python server.py --port 8574 --workers 8
+#     curl -d '{"span_length": 100, "x_loc": 50}' localhost:8574/calculate
+#
+# POST a JSON object to /calculate (span_length, x_loc and, optionally,
+# the other SpanCase fields and engine), /envelope (span_length, n,
+# increment, impact_factor, dist_factor, train, engine), /continuous
+# (spans, n, ...) or /reactions (spans, ...). train is a name or an inline
+# definition as in a train file. GET /trains, /engines or /stats for the
+# lists and counters. Bad input, including sizes that would tie up a
+# worker, gets a 400 with {"error": message}; anything else that goes
+# wrong, including a result that isn't finite, gets a 500 and isn't
+# cached. If a worker dies the pool is replaced.
+#
+# Sweeps run on a process pool. Unfactored values are kept in one result
+# cache (the calculator's persistent one by default) and factors are
+# applied as each response goes out, so factor-only changes never reach
+# the pool. A request that is already being worked out, by whoever asked
+# first, waits for that computation rather than starting its own.
+# The server binds to localhost unless told otherwise; it has no
+# authentication.
+
+import argparse
+import concurrent.futures
+import functools
+import http.server
+import json
+import math
+import sys
+import threading
+import urllib.parse
+
+import cache
+import engine
+import trains
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8574
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1 << 20
+
+# Smallest increment (inches) and most axle evaluations (as counted by
+# engine.axle_evaluations, for all the sections) a request may ask for
+MIN_INCREMENT = 1/64
+MAX_EVALUATIONS = 1e9
+
+
+def warm():
+    # Pool initializer: load the user trains and run one small case, so
+    # compiled code is loaded before the first real request
+    trains.load_user_trains()
+    engine.unfactored_result(10, 5)
+
+
+class Service:
+    # The worker pool, the shared cache and the computations in flight.
+    # Safe to use from many threads.
+
+    def __init__(self, workers=None, results=None):
+        self.workers = workers
+        self.executor = self.new_pool()
+        self.cache = (results if results is not None
+                      else cache.ResultCache(persistent=False))
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.requests = 0
+        self.computed = 0
+        self.coalesced = 0
+        self.restarts = 0
+
+    def new_pool(self):
+        return concurrent.futures.ProcessPoolExecutor(self.workers,
+                                                      initializer=warm)
+
+    def unfactored(self, kind, params, compute, *args, **kwargs):
+        # The cached value for these inputs, or compute(*args, **kwargs)
+        # on the pool. Identical requests arriving while it runs share it.
+        # Raises BrokenExecutor if a worker died, after replacing the pool.
+        with self.lock:
+            self.requests += 1
+        value = self.cache.lookup(kind, params)
+        if value is not None:
+            return value
+
+        key = cache.make_key(kind, params)
+        started = False
+        with self.lock:
+            if key in self.in_flight:
+                future, executor = self.in_flight[key]
+                self.coalesced += 1
+            else:
+                # finish() stores the value before it forgets the future,
+                # so a miss here with nothing in flight is new work
+                value = self.cache.get(key)
+                if value is not None:
+                    return value
+                executor = self.executor
+                try:
+                    future = executor.submit(compute, *args, **kwargs)
+                except concurrent.futures.BrokenExecutor:
+                    future = None
+                else:
+                    self.in_flight[key] = (future, executor)
+                    self.computed += 1
+                    started = True
+        if future is None:
+            self.restart(executor)
+            raise concurrent.futures.BrokenExecutor('A worker had stopped')
+        if started:
+            # Outside the lock: a future that is already done runs the
+            # callback straight away
+            future.add_done_callback(functools.partial(self.finish, key))
+        try:
+            return future.result()
+        except concurrent.futures.BrokenExecutor:
+            self.restart(executor)
+            raise
+
+    def finish(self, key, future):
+        if (not future.cancelled() and future.exception() is None
+                and finite(future.result())):
+            self.cache.put(key, future.result())
+        with self.lock:
+            del self.in_flight[key]
+
+    def restart(self, executor):
+        # Replace a pool that has lost a worker (killed for running out of
+        # memory, say), unless another request already has
+        with self.lock:
+            if self.executor is not executor:
+                return
+            self.executor = self.new_pool()
+            self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests,
+                    'cache_hits': self.cache.hits,
+                    'computed': self.computed,
+                    'coalesced': self.coalesced,
+                    'in_flight': len(self.in_flight),
+                    'restarts': self.restarts}
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        self.cache.close()
+
+
+def finite(value):
+    # Whether every number in a result, lists and all, is finite
+    if isinstance(value, (list, tuple)):
+        return all(finite(item) for item in value)
+    return not isinstance(value, float) or math.isfinite(value)
+
+
+def number(body, name, default=None):
+    value = body.get(name, default)
+    if value is None:
+        raise ValueError('Missing ' + name)
+    if isinstance(value, bool):
+        raise ValueError(name + ' must be a number')
+    try:
+        value = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(name + ' must be a number')
+    if not math.isfinite(value):
+        raise ValueError(name + ' must be finite')
+    return value
+
+
+def flag(body, name, default=False):
+    # A JSON true or false; anything else is an error rather than being
+    # taken as true
+    value = body.get(name, default)
+    if not isinstance(value, bool):
+        raise ValueError(name + ' must be true or false')
+    return value
+
+
+def check_size(span_length, increment, train, engine_name, sections=1):
+    # Refuse work that would tie up (or run out of memory in) a worker.
+    # The engines that look at every axle at every position cost more with
+    # a longer train.
+    if increment < MIN_INCREMENT:
+        raise ValueError('Increment must be at least %g in' % MIN_INCREMENT)
+    consist = train.consist(span_length)
+    positions = engine.grid_size(span_length, consist.length, increment)
+    evaluations = sections*engine.axle_evaluations(engine_name, positions,
+                                                   consist)
+    if evaluations > MAX_EVALUATIONS:
+        raise ValueError('Too much work (%.3g axle evaluations); use a '
+                         'larger increment or a faster engine'
+                         % evaluations)
+
+
+def count(body, name, default=None):
+    value = number(body, name, default)
+    if value != int(value):
+        raise ValueError(name + ' must be a whole number')
+    return int(value)
+
+
+def spans(body):
+    value = body.get('spans')
+    if not isinstance(value, list):
+        raise ValueError('spans must be a list of span lengths')
+    return [number({'spans': span}, 'spans') for span in value]
+
+
+def request_train(body):
+    # A registered train by name, or an inline definition
+    train = body.get('train')
+    if isinstance(train, dict):
+        try:
+            return trains.from_dict(train)
+        except (KeyError, TypeError) as error:
+            raise ValueError('Bad train definition: ' + str(error))
+    if train is not None and not isinstance(train, str):
+        raise ValueError('train must be a name or a definition')
+    return trains.get_train(train)
+
+
+def request_engine(body, default):
+    name = body.get('engine') or default
+    engine.get_engine(name)
+    return name
+
+
+def factors(body):
+    return number(body, 'impact_factor', 0), number(body, 'dist_factor', 1)
+
+
+def calculate(service, body):
+    span_length = number(body, 'span_length')
+    increment = number(body, 'increment', 1)
+    engine.check_inputs(span_length, increment)
+    x_loc = engine.resolve_x_loc(span_length, number(body, 'x_loc'),
+                                 flag(body, 'x_is_fraction'))
+    engine_name = request_engine(body, engine.DEFAULT_ENGINE)
+    train = request_train(body)
+    check_size(span_length, increment, train, engine_name)
+    value = service.unfactored(
+        'calculate',
+        engine.result_params(span_length, x_loc, increment, engine_name,
+                             train),
+        engine.unfactored_result, span_length, x_loc, increment,
+        engine_name, train=train)
+    return engine.factor_result(engine.Result(*value), *factors(body))
+
+
+def envelope(service, body):
+    span_length = number(body, 'span_length')
+    n = count(body, 'n', 10)
+    increment = number(body, 'increment', 1)
+    engine.check_inputs(span_length, increment, n)
+    engine_name = request_engine(body, engine.DEFAULT_ENVELOPE_ENGINE)
+    train = request_train(body)
+    check_size(span_length, increment, train, engine_name, n + 1)
+    value = service.unfactored(
+        'envelope',
+        [span_length, n, increment, engine_name, train.key],
+        engine.unfactored_envelope, span_length, n, increment, engine_name,
+        train=train)
+    return engine.factor_envelope(engine.Envelope(*value), *factors(body))
+
+
+def continuous_envelope(service, body):
+    # continuous and reactions need numpy, which the rest of the server
+    # doesn't
+    import continuous
+    lengths = spans(body)
+    n = count(body, 'n', 10)
+    increment = number(body, 'increment', 1)
+    engine.check_spans(lengths)
+    engine.check_inputs(min(lengths), increment, n)
+    train = request_train(body)
+    check_size(sum(lengths), increment, train, 'influence',
+               len(lengths)*(n + 1))
+    value = service.unfactored(
+        'continuous_envelope', [lengths, n, increment, train.key],
+        continuous.unfactored_envelope, lengths, n, increment, train=train)
+    return engine.factor_envelope(continuous.Envelope(*value),
+                                  *factors(body))
+
+
+def reaction_envelope(service, body):
+    import reactions
+    lengths = spans(body)
+    increment = number(body, 'increment', 1)
+    engine.check_spans(lengths)
+    engine.check_inputs(min(lengths), increment)
+    train = request_train(body)
+    check_size(sum(lengths), increment, train, 'window', len(lengths))
+    value = service.unfactored(
+        'reactions', [lengths, increment, train.key],
+        reactions.unfactored_envelope, lengths, increment, train=train)
+    return engine.factor_envelope(reactions.ReactionEnvelope(*value),
+                                  *factors(body))
+
+
+# Handlers for POST requests by path. Each takes the Service and the
+# request's JSON object and returns a namedtuple.
+CALCULATIONS = {'/calculate': calculate,
+                '/envelope': envelope,
+                '/continuous': continuous_envelope,
+                '/reactions': reaction_envelope}
+
+
+def engines():
+    return {'engines': sorted(engine.ENGINES),
+            'default': engine.DEFAULT_ENGINE,
+            'envelope_default': engine.DEFAULT_ENVELOPE_ENGINE}
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    def send_json(self, status, data):
+        # NaN and infinity aren't JSON, so a result holding them is an
+        # internal error
+        try:
+            text = json.dumps(data, allow_nan=False).encode()
+        except ValueError:
+            self.log_error('%s gave a value that is not finite', self.path)
+            status = 500
+            text = json.dumps({'error': 'The result is not finite'}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {'error': message})
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == '/trains':
+            self.send_json(200, {'trains': trains.train_names(),
+                                 'default': trains.DEFAULT_TRAIN})
+        elif path == '/engines':
+            self.send_json(200, engines())
+        elif path == '/stats':
+            self.send_json(200, self.server.service.stats())
+        else:
+            self.send_error_json(404, 'Not found: ' + path)
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path
+        handler = CALCULATIONS.get(path)
+        if handler is None:
+            self.send_error_json(404, 'Not found: ' + path)
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY:
+            self.send_error_json(400, 'Bad Content-Length')
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError('The request must be a JSON object')
+            result = handler(self.server.service, body)
+        except ValueError as error:
+            self.send_error_json(400, str(error))
+        except concurrent.futures.BrokenExecutor:
+            self.send_error_json(500, 'A worker stopped; the pool has been '
+                                 'restarted')
+        except Exception as error:
+            self.log_error('%s failed: %r', path, error)
+            self.send_error_json(500, 'Internal error: %s'
+                                 % type(error).__name__)
+        else:
+            self.send_json(200, result._asdict())
+
+
+class Server(http.server.ThreadingHTTPServer):
+    # An HTTP server with a Service for its handlers
+
+    def __init__(self, address, service):
+        super().__init__(address, Handler)
+        self.service = service
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None,
+          results=None):
+    # Run until interrupted. results is the cache.ResultCache to share (a
+    # memory-only one if None).
+    service = Service(workers, results)
+    with Server((host, port), service) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve calculations and envelopes over HTTP/JSON.')
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help='address to listen on (default localhost)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int,
+                        help='worker processes (default one per core)')
+    parser.add_argument('--no-persist', action='store_true',
+                        help="don't use the persistent result cache")
+    args = parser.parse_args(argv)
+
+    results = (cache.ResultCache(persistent=False) if args.no_persist
+               else cache.open_cache())
+    print('Serving on http://%s:%d/' % (args.host, args.port))
+    sys.stdout.flush()
+    serve(args.host, args.port, args.workers, results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
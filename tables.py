@@ -0,0 +1,254 @@
+# Precomputed envelope tables.
+#
+# Unfactored max moment and max shear are tabulated on a grid of span
+# lengths x section fractions and written to a binary file that is
+# memory-mapped when opened, so looking up a span-fraction case is just an
+# interpolation. An estimate of the largest interpolation error, as a
+# fraction of the span's largest value and measured while building the
+# table, is stored in it. Cases off the grid, at a different increment or
+# for a different engine fall back to the engine.
+#
+# Build a table with:
+#
+#     python tables.py build envelopes.tbl --spans 10 400 --step 1
+#
+# Requires numpy.
+
+import argparse
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+import cache
+import engine
+import trains
+
+
+MAGIC = b'MVCTBL1\n'
+
+# Each cell is checked at spans this many parts of the way across it (at
+# 1/4, 1/2 and 3/4) and at fractions halfway between the table's. The
+# errors measured are multiplied by ERROR_MARGIN before they are stored,
+# as the interpolation can be a little worse between the points checked.
+CHECK_PARTS = 4
+ERROR_MARGIN = 1.25
+
+# Arrays stored in a table, each spans x fractions
+ARRAYS = ('max_moment', 'moment_position', 'max_shear', 'shear_position')
+
+
+def default_path():
+    return os.environ.get('MVCALC_TABLE',
+                          os.path.join(cache.user_cache_dir(),
+                                       'envelopes.tbl'))
+
+
+def span_envelope(span_length, n, increment, engine_name, train=None):
+    # Max moment and max absolute shear at the n-th points, with their
+    # governing positions
+    envelope = engine.unfactored_envelope(span_length, n, increment,
+                                          engine_name, train=train)
+    max_shears = np.asarray(envelope.max_shears)
+    min_shears = np.asarray(envelope.min_shears)
+    positive = max_shears >= -min_shears
+    return np.array([envelope.max_moments,
+                     envelope.moment_positions,
+                     np.where(positive, max_shears, -min_shears),
+                     np.where(positive, envelope.max_shear_positions,
+                              envelope.min_shear_positions)])
+
+
+def interpolate(values, span_index, frac_index):
+    # Bilinear interpolation in a spans x fractions array at fractional
+    # indexes
+    i = min(int(span_index), values.shape[0] - 2)
+    j = min(int(frac_index), values.shape[1] - 2)
+    s = span_index - i
+    f = frac_index - j
+    return float((1 - s)*((1 - f)*values[i, j] + f*values[i, j + 1])
+                 + s*((1 - f)*values[i + 1, j] + f*values[i + 1, j + 1]))
+
+
+def build(path, span_start=10, span_stop=400, span_step=1, n=100,
+          increment=1, engine_name=None, check_every=1, train=None):
+    # Tabulate the envelopes and measure the interpolation error across
+    # every check_every-th span interval, relative to the largest value
+    # for that span. With check_every above 1 the stored error is only a
+    # rough guide.
+    engine.check_inputs(span_start, increment, n)
+    count = int(round((span_stop - span_start)/span_step)) + 1
+    if count < 2:
+        raise ValueError('A table needs at least two spans')
+    spans = span_start + np.arange(count)*span_step
+    engine_name = engine_name or engine.DEFAULT_ENVELOPE_ENGINE
+
+    data = np.empty((len(ARRAYS), count, n + 1))
+    for i, span_length in enumerate(spans):
+        data[:, i] = span_envelope(float(span_length), n, increment,
+                                   engine_name, train)
+
+    # Compare the interpolated values across each checked cell with the
+    # engine. The check runs on a 2n grid so its odd points fall between
+    # the table's fractions.
+    errors = [0.0, 0.0]
+    for i in range(0, count - 1, check_every):
+        for part in range(1, CHECK_PARTS):
+            span_index = i + part/CHECK_PARTS
+            exact = span_envelope(float(span_start + span_index*span_step),
+                                  2*n, increment, engine_name, train)
+            for k, row in enumerate((0, 2)):
+                table = [interpolate(data[row], span_index, j/2)
+                         for j in range(2*n + 1)]
+                worst = np.max(np.abs(np.asarray(table) - exact[row]))
+                errors[k] = max(errors[k], worst/np.max(exact[row]))
+
+    header = {'version': cache.CACHE_VERSION,
+              'span_start': float(span_start),
+              'span_step': float(span_step),
+              'spans': count,
+              'n': n,
+              'increment': increment,
+              'engine': engine_name,
+              'train': engine.train_key(train),
+              'arrays': ARRAYS,
+              'moment_error': ERROR_MARGIN*errors[0],
+              'shear_error': ERROR_MARGIN*errors[1]}
+    text = json.dumps(header).encode()
+    # Pad the header so the data starts on an 8-byte boundary
+    text += b' '*(-(len(MAGIC) + 8 + len(text)) % 8)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(text)))
+        f.write(text)
+        f.write(data.astype('<f8').tobytes())
+    return header
+
+
+class EnvelopeTable:
+    # A table file opened for lookups. The data stays on disk and is paged
+    # in by the OS as it is read.
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(path + ' is not an envelope table')
+            size, = struct.unpack('<Q', f.read(8))
+            self.header = json.loads(f.read(size))
+        # Tables from before an engine fix would give the old answers
+        if self.header.get('version') != cache.CACHE_VERSION:
+            raise ValueError(path + ' was built by another version; '
+                             'rebuild it')
+        self.path = path
+        self.span_start = self.header['span_start']
+        self.span_step = self.header['span_step']
+        self.n = self.header['n']
+        self.increment = self.header['increment']
+        self.engine_name = self.header['engine']
+        self.span_stop = (self.span_start
+                          + (self.header['spans'] - 1)*self.span_step)
+        self.train_key = self.header['train']
+        self.moment_error = self.header['moment_error']
+        self.shear_error = self.header['shear_error']
+        self.data = np.memmap(path, dtype='<f8', mode='r',
+                              offset=len(MAGIC) + 8 + size,
+                              shape=(len(ARRAYS), self.header['spans'],
+                                     self.n + 1))
+
+    def covers(self, span_length, fraction, increment=1, train=None,
+               engine_name=None):
+        # Only usable at the increment and for the train the table was
+        # built for, if the train hasn't changed since, and for its engine
+        # if one is asked for
+        return (self.span_start <= span_length <= self.span_stop
+                and 0 <= fraction <= 1
+                and increment == self.increment
+                and engine_name in (None, self.engine_name)
+                and self.train_key == json.loads(json.dumps(
+                    engine.train_key(train))))
+
+    def lookup(self, span_length, fraction, increment=1, train=None,
+               engine_name=None):
+        # Unfactored Result for a section at a fraction of the span, or
+        # None if the table doesn't cover it. Max moment and shear are
+        # interpolated; the governing positions are those of the nearest
+        # grid point.
+        if not self.covers(span_length, fraction, increment, train,
+                           engine_name):
+            return None
+        span_index = (span_length - self.span_start)/self.span_step
+        frac_index = fraction*self.n
+        nearest = (int(round(span_index)), int(round(frac_index)))
+        return engine.Result(
+            interpolate(self.data[0], span_index, frac_index),
+            float(self.data[1][nearest]),
+            interpolate(self.data[2], span_index, frac_index),
+            float(self.data[3][nearest]))
+
+    def describe(self):
+        # How a looked-up result was found, for a status line
+        return ("interpolated from table, off by up to about %.2f%% "
+                "(moment), %.2f%% (shear) of the span's maximum"
+                % (100*self.moment_error, 100*self.shear_error))
+
+    def calculate(self, span_length, x_loc, increment=1, impact_factor=0,
+                  dist_factor=1, x_is_fraction=False, engine_name=None,
+                  cache=None, train=None):
+        # engine.calculate, answered from the table when it covers the
+        # case
+        engine.check_inputs(span_length, increment)
+        fraction = x_loc if x_is_fraction else x_loc/span_length
+        result = self.lookup(span_length, fraction, increment, train,
+                             engine_name)
+        if result is None:
+            return engine.calculate(span_length, x_loc, increment,
+                                    impact_factor, dist_factor,
+                                    x_is_fraction, engine=engine_name,
+                                    cache=cache, train=train)
+        return engine.factor_result(result, impact_factor, dist_factor)
+
+
+def open_table(path=None):
+    # The table at path (or the default location), or None if there isn't
+    # a usable one
+    try:
+        return EnvelopeTable(path or default_path())
+    except (OSError, ValueError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Build a precomputed envelope table.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build')
+    build_parser.add_argument('path', nargs='?', default=default_path())
+    build_parser.add_argument('--spans', nargs=2, type=float,
+                              default=[10, 400], metavar=('FIRST', 'LAST'),
+                              help='span range in feet')
+    build_parser.add_argument('--step', type=float, default=1,
+                              help='span step in feet')
+    build_parser.add_argument('-n', type=int, default=100,
+                              help='number of span divisions')
+    build_parser.add_argument('--increment', type=float, default=1,
+                              help='increment in inches')
+    build_parser.add_argument('--engine', choices=sorted(engine.ENGINES))
+    build_parser.add_argument('--train', choices=trains.train_names())
+    args = parser.parse_args(argv)
+
+    header = build(args.path, args.spans[0], args.spans[1], args.step,
+                   args.n, args.increment, args.engine, train=args.train)
+    print("Wrote %s: %d spans x %d points, estimated max interpolation "
+          "error %.3f%% (moment), %.3f%% (shear) of the span's maximum"
+          % (args.path, header['spans'], header['n'] + 1,
+             100*header['moment_error'], 100*header['shear_error']))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# Cross-checks of every registered engine. Run with `python -m pytest`.
+#
+# The histories must match the reference engine evaluated at the same
+# train positions to rounding, and the extremes from calculate and
+# envelope must pass the same check as `python bench.py --verify`: within
+# one step of the reference and never above the exact engine.
+
+import math
+
+import pytest
+
+import bench
+import engine
+import trains
+
+
+ENGINE_NAMES = sorted(engine.ENGINES)
+
+SPANS = (10, 37.5, 100)
+SECTIONS = (0, 0.3, 0.5, 1)
+INCREMENTS = (1, 12)
+TRAINS = sorted(trains.TRAINS)
+
+# Relative to the largest value in the history, or 1
+HISTORY_TOLERANCE = 1e-9
+
+
+def close(values, expected, either_sign=False):
+    # Moments at a support are rounding noise about zero, so the scale is
+    # at least 1. With an axle at the section and the shear the same size
+    # on both sides of it, rounding decides which side an engine takes, so
+    # shears can match in size only.
+    scale = max([1.0] + [abs(value) for value in expected])
+    if either_sign:
+        values = [abs(value) for value in values]
+        expected = [abs(value) for value in expected]
+    return all(abs(value - other) <= HISTORY_TOLERANCE*scale
+               for value, other in zip(values, expected))
+
+
+@pytest.mark.parametrize('name', ENGINE_NAMES)
+@pytest.mark.parametrize('span_length', SPANS)
+@pytest.mark.parametrize('fraction', SECTIONS)
+@pytest.mark.parametrize('increment', INCREMENTS)
+def test_history_matches_reference(name, span_length, fraction, increment):
+    if name == 'exact':
+        pytest.skip('the exact engine takes one side of every jump')
+    x_loc = span_length*fraction
+    consist = trains.get_train().consist(span_length)
+    positions, m_array, v_array = engine.ENGINES[name](
+        span_length, x_loc, consist, increment)
+    positions = [float(position) for position in positions]
+    m_ref, v_ref = engine.effects_reference(span_length, x_loc, consist,
+                                            positions)
+
+    assert len(m_array) == len(m_ref) == len(positions)
+    assert close(m_array, m_ref)
+    assert close(v_array, v_ref, either_sign=True)
+
+
+@pytest.mark.parametrize('name', ENGINE_NAMES)
+@pytest.mark.parametrize('span_length', SPANS)
+@pytest.mark.parametrize('train', TRAINS)
+def test_calculate_matches_exact(name, span_length, train):
+    for fraction in SECTIONS:
+        for increment in INCREMENTS:
+            def run(engine_name):
+                return engine.calculate(span_length, fraction, increment,
+                                        x_is_fraction=True,
+                                        engine=engine_name, train=train)
+
+            status, worst = bench.check_result(
+                name, run(name), run('reference'), run('exact'),
+                span_length, increment, train)
+            assert status == 'ok', (fraction, increment, worst)
+
+
+@pytest.mark.parametrize('name', ENGINE_NAMES)
+@pytest.mark.parametrize('span_length', SPANS)
+def test_envelope_matches_exact(name, span_length):
+    for increment in INCREMENTS:
+        def run(engine_name):
+            return engine.envelope(span_length, 10, increment,
+                                   engine=engine_name)
+
+        result = run(name)
+        assert all(math.isfinite(value) for value in result.max_moments)
+        status, worst = bench.check_result(
+            name, result, run('reference'), run('exact'), span_length,
+            increment)
+        assert status == 'ok', (increment, worst)
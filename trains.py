@@ -0,0 +1,256 @@
+# Train library.
+#
+# A train is its axle loads (kips) and spacings (feet), plus an optional
+# trailing uniform load (kips/ft) that starts a gap behind the last axle
+# and is as long as the span. The built-in trains are defined below. More
+# can be added without touching the code by putting JSON files in the user
+# train directory (see user_train_dirs), each holding one definition or a
+# list of them:
+#
+#     {"name": "HH-315", "axle_loads": [78.75, 78.75, ...],
+#      "axle_spaces": [0, 5.83, ...]}
+#
+# A definition can also be a scaled copy of another train:
+#
+#     {"name": "E70", "base": "E80", "scale": 0.875}
+#
+# Each train's offsets are worked out once, when it is defined, and the
+# consist for a given span is built once and shared by every engine and
+# plot, along with its running sums and its arrays.
+
+import collections
+import functools
+import glob
+import json
+import math
+import os
+import sys
+import warnings
+
+
+class Consist(collections.namedtuple('Consist', ['loads',
+                                                 'offsets',
+                                                 'segments'])):
+    # A train as point loads at offsets (feet behind the front of the
+    # train, in order) plus uniform load segments given as (start, end,
+    # kips/ft) offsets. end can be math.inf for a load that trails off
+    # past the span. sums and arrays are worked out the first time they
+    # are used and kept.
+
+    @property
+    def length(self):
+        # Offset past which nothing more leaves the span: once the front
+        # of the train is this far past the last support, the span carries
+        # only the tail of any endless uniform load
+        ends = [end if end != math.inf else start
+                for start, end, _ in self.segments]
+        return max(list(self.offsets[-1:]) + ends + [0])
+
+    @functools.cached_property
+    def sums(self):
+        # Running totals of the axle loads and of load x offset, from 0,
+        # for the running-sum engines
+        sums = [0.0]
+        moments = [0.0]
+        for load, offset in zip(self.loads, self.offsets):
+            sums.append(sums[-1] + load)
+            moments.append(moments[-1] + load*offset)
+        return tuple(sums), tuple(moments)
+
+    @functools.cached_property
+    def arrays(self):
+        # The loads, offsets, running sums and segments as read-only numpy
+        # arrays, the segments as rows of (start, end, kips/ft). Needs
+        # numpy.
+        import numpy as np
+        sums, moments = self.sums
+        arrays = ConsistArrays(
+            np.asarray(self.loads, dtype=float),
+            np.asarray(self.offsets, dtype=float),
+            np.asarray(sums), np.asarray(moments),
+            np.asarray(self.segments, dtype=float).reshape(-1, 3))
+        for array in arrays:
+            array.flags.writeable = False
+        return arrays
+
+
+ConsistArrays = collections.namedtuple('ConsistArrays', ['loads',
+                                                         'offsets',
+                                                         'sums',
+                                                         'moments',
+                                                         'segments'])
+
+
+class Train(collections.namedtuple('Train', ['name',
+                                             'loads',
+                                             'offsets',
+                                             'uniform_load',
+                                             'uniform_gap'])):
+    # A compiled train definition. loads and offsets are tuples of floats,
+    # so a Train can't be changed once it is made and can be used as a
+    # cache key.
+
+    @property
+    def key(self):
+        # Identifies the loading for result caching. The name is left out
+        # so that identical trains share results.
+        return ['train', self.loads, self.offsets, self.uniform_load,
+                self.uniform_gap]
+
+    def consist(self, span_length):
+        return compile_consist(self, span_length)
+
+    def scaled(self, factor, name):
+        # The same train with every load multiplied by factor, like the
+        # Cooper E-series classes
+        return Train(name, tuple(load*factor for load in self.loads),
+                     self.offsets, self.uniform_load*factor,
+                     self.uniform_gap)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_consist(train, span_length):
+    # The loads on a span of this length. The trailing uniform load is as
+    # long as the span, so the tail of the train can leave it partly
+    # loaded.
+    segments = ()
+    if train.uniform_load:
+        start = train.offsets[-1] + train.uniform_gap
+        segments = ((start, start + span_length, train.uniform_load),)
+    return Consist(train.loads, train.offsets, segments)
+
+
+def define(name, axle_loads, axle_spaces, uniform_load=0, uniform_gap=0):
+    # A Train from axle loads and the spacing in front of each axle (0 for
+    # the first)
+    if not axle_loads or len(axle_loads) != len(axle_spaces):
+        raise ValueError('Train ' + str(name) + ' needs one spacing per '
+                         'axle load')
+    axle_loads = [float(load) for load in axle_loads]
+    axle_spaces = [float(spac) for spac in axle_spaces]
+    uniform_load = float(uniform_load)
+    uniform_gap = float(uniform_gap)
+    # NaN fails every comparison, so it is checked for first
+    if not all(math.isfinite(value) for value in
+               axle_loads + axle_spaces + [uniform_load, uniform_gap]):
+        raise ValueError('Train ' + str(name) + ' has a load or spacing '
+                         'that is not a finite number')
+    if min(axle_spaces) < 0 or min(axle_loads) < 0:
+        raise ValueError('Train ' + str(name) + ' has a negative load or '
+                         'spacing')
+    if uniform_load < 0 or uniform_gap < 0:
+        raise ValueError('Train ' + str(name) + ' has a negative uniform '
+                         'load or gap')
+    offsets = []
+    offset = 0.0
+    for spac in axle_spaces:
+        offset += spac
+        offsets.append(offset)
+    return Train(str(name), tuple(axle_loads), tuple(offsets),
+                 uniform_load, uniform_gap)
+
+
+# Cooper E-80 Axle Layout, followed by 8 kips/ft starting 5 ft behind the
+# last axle
+E80 = define('E80',
+             (40, 80, 80, 80, 80, 52, 52, 52, 52,
+              40, 80, 80, 80, 80, 52, 52, 52, 52),
+             (0, 8, 5, 5, 5, 9, 5, 6, 5,
+              8, 8, 5, 5, 5, 9, 5, 6, 5),
+             uniform_load=8, uniform_gap=5)
+
+# AREMA Alternate Live Load: four 100 kip axles
+E80_ALTERNATE = define('E80 Alternate', (100, 100, 100, 100), (0, 5, 6, 5))
+
+# Trains by name, in the order they are offered
+TRAINS = collections.OrderedDict()
+
+DEFAULT_TRAIN = 'E80'
+
+user_trains_loaded = False
+
+
+def register(train):
+    TRAINS[train.name] = train
+    return train
+
+
+for built_in in (E80.scaled(0.75, 'E60'), E80, E80.scaled(1.125, 'E90'),
+                 E80_ALTERNATE.scaled(0.75, 'E60 Alternate'), E80_ALTERNATE,
+                 E80_ALTERNATE.scaled(1.125, 'E90 Alternate')):
+    register(built_in)
+
+
+def from_dict(data):
+    # A Train from a JSON definition
+    if 'base' in data:
+        scale = float(data.get('scale', 1))
+        if not math.isfinite(scale) or scale < 0:
+            raise ValueError('Train ' + str(data['name']) + ' needs a '
+                             'finite scale that is not negative')
+        return get_train(data['base']).scaled(scale, str(data['name']))
+    return define(data['name'], data['axle_loads'], data['axle_spaces'],
+                  float(data.get('uniform_load', 0)),
+                  float(data.get('uniform_gap', 0)))
+
+
+def load_file(path):
+    # Register the trains defined in a JSON file and return them. Raises
+    # ValueError if the file isn't a valid definition.
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [data]
+    try:
+        return [register(from_dict(item)) for item in data]
+    except (KeyError, TypeError) as error:
+        raise ValueError(path + ': bad train definition: ' + str(error))
+
+
+def user_train_dirs():
+    # Directories listed in $MVCALC_TRAINS, then the user's config
+    # directory
+    dirs = [d for d in os.environ.get('MVCALC_TRAINS', '').split(os.pathsep)
+            if d]
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support')
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME',
+                              os.path.expanduser('~/.config'))
+    dirs.append(os.path.join(base, 'mvcalc', 'trains'))
+    return dirs
+
+
+def load_user_trains():
+    # Load every *.json file in the user train directories, once. A bad
+    # file is skipped with a warning rather than stopping the program.
+    global user_trains_loaded
+    if user_trains_loaded:
+        return
+    user_trains_loaded = True
+    for directory in user_train_dirs():
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            try:
+                load_file(path)
+            except (OSError, ValueError) as error:
+                warnings.warn('Skipping train file ' + path + ': '
+                              + str(error))
+
+
+def train_names():
+    load_user_trains()
+    return list(TRAINS)
+
+
+def get_train(train=None):
+    # The Train for a name (the default train if None). Train objects are
+    # passed through, so callers can use trains that aren't registered.
+    if isinstance(train, Train):
+        return train
+    load_user_trains()
+    try:
+        return TRAINS[train or DEFAULT_TRAIN]
+    except KeyError:
+        raise ValueError('Unknown train: ' + str(train))